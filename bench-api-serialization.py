@@ -0,0 +1,78 @@
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from modules.json_provider import OrjsonProvider, orjson
+from modules import compression
+from datetime import date, timedelta
+import argparse
+import random
+import time
+
+# Synthetic payloads shaped like the API's largest responses (one full page where paged).
+def match_rows(n):
+    return [
+        {
+            "MATCH_ID": 11000000000 + i, "P1": f"player_{i % 700}", "P1_ARCH": "COMBO", "P1_SUBARCH": "DOOMSDAY",
+            "P1_WINS": random.randint(0, 2), "P2": f"player_{(i * 7) % 700}", "P2_ARCH": "CONTROL",
+            "P2_SUBARCH": "OATH", "P2_WINS": random.randint(0, 2), "MATCH_WINNER": random.choice(["P1", "P2"]),
+            "EVENT_DATE": date(2024, 8, 25) + timedelta(days=i // 200),
+        }
+        for i in range(n)
+    ]
+
+def event_rows(n):
+    return [
+        {"EVENT_ID": 12000000000 + i, "EVENT_DATE": date(2024, 8, 25) + timedelta(days=i // 3),
+         "FORMAT": "VINTAGE", "EVENT_TYPE": "CHALLENGE 32", "TOTAL_PLAYERS": random.randint(8, 120)}
+        for i in range(n)
+    ]
+
+def standings_rows(n):
+    return [
+        {"EVENT_DATE": date(2024, 8, 25), "EVENT_TYPE": "CHALLENGE 64", "EVENT_RANK": i + 1, "P1": f"player_{i}",
+         "WINS": random.randint(0, 7), "LOSSES": random.randint(0, 7), "BYES": 0}
+        for i in range(n)
+    ]
+
+def time_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API JSON encoders and response compression.")
+    parser.add_argument("--repeat", type=int, default=50, help="Iterations per measurement (default: 50).")
+    args = parser.parse_args()
+
+    random.seed(0)
+    payloads = {
+        "/matches/ (page)": match_rows(1000),
+        "/events/ (page)": event_rows(1000),
+        "/events/<id>/standings/": standings_rows(64),
+    }
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    default_provider.sort_keys = False
+    fast_provider = OrjsonProvider(app)
+    fast_provider.sort_keys = False
+    if orjson is None:
+        print("orjson is not installed; OrjsonProvider falls back to the default encoder.")
+
+    header = f"{'endpoint':<26}{'default ms':>11}{'orjson ms':>11}{'raw bytes':>11}{'gzip bytes':>12}{'gzip ms':>9}{'br bytes':>10}{'br ms':>8}"
+    print(header)
+    print("-" * len(header))
+    with app.app_context():
+        for name, rows in payloads.items():
+            default_ms, _ = time_ms(lambda: default_provider.response(rows).get_data(), args.repeat)
+            fast_ms, body = time_ms(lambda: fast_provider.response(rows).get_data(), args.repeat)
+            gzip_ms, gzipped = time_ms(lambda: compression.compress(body, "gzip"), args.repeat)
+            if compression.brotli is not None:
+                br_ms, brotlied = time_ms(lambda: compression.compress(body, "br"), args.repeat)
+                br_cols = f"{len(brotlied):>10}{br_ms:>8.2f}"
+            else:
+                br_cols = f"{'n/a':>10}{'n/a':>8}"
+            print(f"{name:<26}{default_ms:>11.2f}{fast_ms:>11.2f}{len(body):>11}{len(gzipped):>12}{gzip_ms:>9.2f}{br_cols}")
+
+if __name__ == "__main__":
+    main()
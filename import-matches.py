@@ -1,9 +1,11 @@
 from modules.match_import import parse_matchup_sheet, match_insert, insert_load_stats
 from modules.classifications import parse_class_sheet, class_insert
+from modules.snapshots import write_snapshot
 import warnings
 from datetime import datetime, timedelta
 import time
 import argparse
+import logging
 warnings.filterwarnings('ignore', category=UserWarning, message="pandas only supports SQLAlchemy connectable")
 
 def parse_args():
@@ -30,6 +32,12 @@ def parse_args():
         default=True,
         help="Enable/disable debug Excel exports (default: enabled).",
     )
+    parser.add_argument(
+        "--snapshot",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Enable/disable writing the post-load snapshot to SNAPSHOT_DIR (default: enabled).",
+    )
     return parser.parse_args()
 
 def parse_date(date_str, arg_name):
@@ -39,6 +47,7 @@ def parse_date(date_str, arg_name):
         raise ValueError(f"{arg_name} must be YYYY-MM-DD. Received: {date_str}") from exc
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     args = parse_args()
     start_date = parse_date(args.start_date, "start_date")
     end_date = parse_date(args.end_date, "end_date")
@@ -68,13 +77,17 @@ def main():
         export_debug_excels=args.debug_excels
     )
     load_report = [start_date,end_date - timedelta(days=1)] + load_rep_list + load_rep_ins
-    insert_load_stats(
+    load_rpt_id = insert_load_stats(
         load_report=load_report, 
         event_rej=event_skipped_rej + event_rej, 
         match_rej=match_rej, 
         standing_rej=standing_rej
     )
 
+    if args.snapshot and load_rpt_id:
+        print("Writing snapshot...")
+        write_snapshot(load_rpt_id)
+
     print(time.time() - start_time)
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import threading
+import time
+
+class ClassificationCache:
+    """In-process copy of VALID_DECKS and VALID_EVENT_TYPES, reloaded when their version marker moves."""
+
+    marker_query = '''
+    SELECT
+        (SELECT COUNT(*) FROM "[vapi].VALID_DECKS") AS "DECKS",
+        (SELECT MAX("PROC_DT") FROM "[vapi].VALID_DECKS") AS "DECKS_PROC_DT",
+        (SELECT COUNT(*) FROM "[vapi].VALID_EVENT_TYPES") AS "EVENT_TYPES",
+        (SELECT MAX("PROC_DT") FROM "[vapi].VALID_EVENT_TYPES") AS "EVENT_TYPES_PROC_DT"
+    '''
+    decks_query = '''
+    SELECT "FORMAT", "ARCHETYPE", "SUBARCHETYPE", "DECK_ID"
+        FROM "[vapi].VALID_DECKS"
+        ORDER BY "DECK_ID"
+    '''
+    event_types_query = '''
+    SELECT "FORMAT", "EVENT_TYPE", "EVENT_TYPE_ID"
+        FROM "[vapi].VALID_EVENT_TYPES"
+        ORDER BY "EVENT_TYPE_ID"
+    '''
+
+    def __init__(self, run_query, check_seconds=60.0):
+        self._run_query = run_query
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._marker = None
+        # (decks, decks_by_id, event_types, event_types_by_id), swapped as a whole on reload.
+        self._snapshot = None
+        self.reloads = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+            marker = self._run_query(self.marker_query)[0]
+            marker = tuple(marker.values())
+            if marker != self._marker or self._snapshot is None:
+                decks = self._run_query(self.decks_query)
+                event_types = self._run_query(self.event_types_query)
+                self._snapshot = (
+                    decks,
+                    {row["DECK_ID"]: row for row in decks},
+                    event_types,
+                    {row["EVENT_TYPE_ID"]: row for row in event_types},
+                )
+                self._marker = marker
+                self.reloads += 1
+            self._checked_at = now
+
+    def version(self):
+        self._refresh()
+        return "|".join(str(value) for value in self._marker)
+
+    def last_modified(self):
+        self._refresh()
+        dates = [value for value in (self._marker[1], self._marker[3]) if value is not None]
+        return max(dates) if dates else None
+
+    def decks(self):
+        self._refresh()
+        return self._snapshot[0]
+
+    def decks_by_id(self):
+        self._refresh()
+        return self._snapshot[1]
+
+    def event_types(self):
+        self._refresh()
+        return self._snapshot[2]
+
+    def event_types_by_id(self):
+        self._refresh()
+        return self._snapshot[3]
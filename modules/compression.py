@@ -0,0 +1,40 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=5):
+    """Compress a buffered response body in place when the client accepts it and it is large enough."""
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding, gzip_level=gzip_level, brotli_quality=brotli_quality))
+    response.headers["Content-Encoding"] = encoding
+    return response
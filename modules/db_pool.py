@@ -0,0 +1,237 @@
+import psycopg2
+import threading
+import time
+import os
+from collections import deque
+from contextlib import contextmanager
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    """Per-process, thread-safe pool of psycopg2 connections."""
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0, max_age=1800.0, check_idle=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        # Set by pin(): connection() on this thread reuses one checked-out connection.
+        self._local = threading.local()
+        # Idle entries are (conn, returned_at); LIFO keeps a small set of connections warm.
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "pinned": 0,
+        }
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["created"] += 1
+        return conn
+
+    def _close(self, conn):
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def warm(self):
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._stats["checkouts"] += 1
+        while True:
+            with self._cond:
+                if not self._idle and self._size >= self.max_size:
+                    self._stats["waits"] += 1
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection.")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    conn, returned_at = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            created_at = self._created_at.get(id(conn), 0.0)
+            if self.max_age and time.monotonic() - created_at > self.max_age:
+                self._count("recycled")
+                self._close(conn)
+                continue
+            if not self._is_healthy(conn, returned_at):
+                self._count("health_check_failures")
+                self._close(conn)
+                continue
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open (or aborted) transaction.
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed:
+            self._count("discarded")
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        pinned = getattr(self._local, "conn", None)
+        if pinned is not None:
+            try:
+                yield pinned
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Broken connection: release it now so the rest of the pinned block checks out fresh ones.
+                self._local.conn = None
+                self.putconn(pinned, discard=True)
+                raise
+            except psycopg2.Error:
+                pinned.rollback()
+                raise
+            return
+
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    @contextmanager
+    def pin(self):
+        """Serve every connection() call on this thread from one checked-out connection until the block exits."""
+        if getattr(self._local, "conn", None) is not None:
+            yield self._local.conn
+            return
+        conn = self.getconn()
+        self._count("pinned")
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            if self._local.conn is conn:
+                self._local.conn = None
+                self.putconn(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                pid=self._pid,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+            )
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+# Connections inherited across a fork share sockets with the parent; keep them referenced
+# so they are never closed (or garbage collected) from the child.
+_inherited_pools = []
+
+def get_pool(connect, **kwargs):
+    global _pool
+    pool = _pool
+    if pool is not None and pool._pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is not None and _pool._pid != os.getpid():
+            _inherited_pools.append(_pool)
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool(connect, **kwargs)
+            _pool.warm()
+        return _pool
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    _pool_lock = threading.Lock()
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+        _pool = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
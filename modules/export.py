@@ -0,0 +1,120 @@
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# format: (mimetype, file extension, needs pyarrow)
+export_formats = {
+    "csv": ("text/csv", "csv", False),
+    "parquet": ("application/vnd.apache.parquet", "parquet", True),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", True),
+}
+
+def arrow_type(type_code):
+    # psycopg2 reports the Postgres type OID as type_code.
+    if pa is None:
+        return None
+    return {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp("us"),
+        1184: pa.timestamp("us", tz="UTC"),
+        1700: pa.decimal128(38, 10),
+    }.get(type_code, pa.string())
+
+def arrow_schema(description):
+    return pa.schema([(column.name, arrow_type(column.type_code)) for column in description])
+
+def record_batch(schema, rows):
+    columns = list(zip(*rows)) if rows else [() for _ in schema]
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == pa.string():
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+class ChunkSink:
+    """Write-only file object; the response generator drains whatever the Arrow writers have flushed."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def generate_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    header_written = False
+    for description, rows in batches:
+        if not header_written:
+            writer.writerow([column.name for column in description])
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+def generate_arrow(batches, fmt):
+    # Each fetched batch becomes one Parquet row group / one Arrow IPC record batch.
+    sink = ChunkSink()
+    writer = None
+    try:
+        for description, rows in batches:
+            if writer is None:
+                schema = arrow_schema(description)
+                if fmt == "parquet":
+                    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+                else:
+                    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+            if rows:
+                batch = record_batch(schema, rows)
+                if fmt == "parquet":
+                    writer.write_batch(batch, row_group_size=len(rows))
+                else:
+                    writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+def generate(batches, fmt):
+    """Encode (cursor.description, rows) batches from a server-side cursor as a csv, parquet or arrow stream."""
+    if fmt == "csv":
+        return generate_csv(batches)
+    return generate_arrow(batches, fmt)
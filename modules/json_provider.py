@@ -0,0 +1,50 @@
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from datetime import date
+import dataclasses
+import decimal
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(o):
+    # Same fallbacks as Flask's DefaultJSONProvider so payloads are unchanged (dates as HTTP dates).
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson; falls back to Flask's encoder when orjson is not installed."""
+
+    def _options(self):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact, so formatting kwargs such as separators are ignored.
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
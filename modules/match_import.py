@@ -31,9 +31,9 @@ def _refresh_env():
     gsheets = [os.getenv("VINTAGE_SHEET_CURR"), os.getenv("VINTAGE_SHEET_ARCHIVE"), os.getenv("VINTAGE_GID_MATCHES"), os.getenv("VINTAGE_GID_DECK"), os.getenv('VINTAGE_GID_STANDINGS')]
 
 
-def get_df(query, vars=()):
+def get_connection():
     _refresh_env()
-    conn = psycopg2.connect(
+    return psycopg2.connect(
         host=credentials[0],
         port=credentials[1],
         user=credentials[2],
@@ -42,6 +42,9 @@ def get_df(query, vars=()):
         sslmode='require'
     )
 
+def get_df(query, vars=()):
+    conn = get_connection()
+
     df = pd.read_sql(query,conn,params=vars)
 
     conn.close()
@@ -591,6 +594,159 @@ def parse_matchup_sheet(start_date=None, end_date=None, export_debug_excels=True
 
     return df, df_events, df_standings, [records_full_ds,records_total,events_ignored,records_proc], skipped_events_rej, standings_skipped
 
+def refresh_players(cursor, start_date, end_date, proc_dt):
+    # Add new names from the reloaded date window to PLAYERS, then set the player id columns on its matches and standings.
+    insert_query = """
+        INSERT INTO "[vapi].PLAYERS" ("PLAYER_NAME", "PLAYER_KEY", "PROC_DT")
+        SELECT DISTINCT ON (upper(trim(x."NAME"))) trim(x."NAME"), upper(trim(x."NAME")), %s
+        FROM (
+            SELECT unnest(ARRAY[m."P1", m."P2"]) AS "NAME" FROM "[vapi].MATCHES" m
+            JOIN "[vapi].EVENTS" e
+            ON m."EVENT_ID" = e."EVENT_ID"
+            WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s
+            UNION ALL
+            SELECT es."P1" FROM "[vapi].EVENT_STANDINGS" es
+            JOIN "[vapi].EVENTS" e
+            ON es."EVENT_ID" = e."EVENT_ID"
+            WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s
+        ) x
+        WHERE trim(x."NAME") <> ''
+        ORDER BY upper(trim(x."NAME")), x."NAME"
+        ON CONFLICT ("PLAYER_KEY") DO NOTHING
+    """
+    update_matches_query = """
+        UPDATE "[vapi].MATCHES" m
+        SET "P1_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(m."P1"))),
+            "P2_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(m."P2")))
+        WHERE m."EVENT_ID" IN (
+            SELECT "EVENT_ID" FROM "[vapi].EVENTS"
+            WHERE "EVENT_DATE" >= %s AND "EVENT_DATE" < %s
+        )
+    """
+    update_standings_query = """
+        UPDATE "[vapi].EVENT_STANDINGS" es
+        SET "P1_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(es."P1")))
+        WHERE es."EVENT_ID" IN (
+            SELECT "EVENT_ID" FROM "[vapi].EVENTS"
+            WHERE "EVENT_DATE" >= %s AND "EVENT_DATE" < %s
+        )
+    """
+    cursor.execute(insert_query, (proc_dt, start_date, end_date, start_date, end_date))
+    players_added = cursor.rowcount
+    cursor.execute(update_matches_query, (start_date, end_date))
+    cursor.execute(update_standings_query, (start_date, end_date))
+    return players_added
+
+def refresh_event_total_players(cursor, start_date, end_date):
+    # Distinct players (P1 or P2) in the matches actually stored for each event, after rejections. Uses the player ids
+    # set by refresh_players, so differently cased spellings count once. Events without matches get 0 and stay hidden.
+    update_query = """
+        UPDATE "[vapi].EVENTS" e
+        SET "TOTAL_PLAYERS" = (
+            SELECT COUNT(DISTINCT x."PLAYER_ID")
+            FROM "[vapi].MATCHES" m
+            CROSS JOIN LATERAL unnest(ARRAY[m."P1_ID", m."P2_ID"]) AS x("PLAYER_ID")
+            WHERE m."EVENT_ID" = e."EVENT_ID"
+        )
+        WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s
+    """
+    cursor.execute(update_query, (start_date, end_date))
+    return cursor.rowcount
+
+def refresh_player_event_records(cursor, start_date, end_date, proc_dt):
+    # Rebuild per-player W/L, date and final rank for every event in the reloaded date window.
+    delete_query = """
+        DELETE FROM "[vapi].PLAYER_EVENT_RECORDS"
+        WHERE "EVENT_ID" IN (
+            SELECT "EVENT_ID" FROM "[vapi].EVENTS"
+            WHERE "EVENT_DATE" >= %s AND "EVENT_DATE" < %s
+        )
+    """
+    insert_query = """
+        INSERT INTO "[vapi].PLAYER_EVENT_RECORDS" ("EVENT_ID", "P1_ID", "WINS", "LOSSES", "EVENT_DATE", "EVENT_RANK", "PROC_DT")
+        SELECT m."EVENT_ID", m."P1_ID",
+            SUM(CASE WHEN m."MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN m."MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END),
+            e."EVENT_DATE",
+            (
+                SELECT MIN(es."EVENT_RANK")
+                FROM "[vapi].EVENT_STANDINGS" es
+                WHERE es."EVENT_ID" = m."EVENT_ID" AND es."P1_ID" = m."P1_ID"
+            ),
+            %s
+        FROM "[vapi].MATCHES" m
+        JOIN "[vapi].EVENTS" e
+        ON m."EVENT_ID" = e."EVENT_ID"
+        WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s AND m."P1_ID" IS NOT NULL
+        GROUP BY m."EVENT_ID", m."P1_ID", e."EVENT_DATE"
+    """
+    cursor.execute(delete_query, (start_date, end_date))
+    cursor.execute(insert_query, (proc_dt, start_date, end_date))
+    return cursor.rowcount
+
+def refresh_deck_matchups(cursor, start_date, end_date, proc_dt):
+    # Rebuild daily deck-vs-deck results for the reloaded date window only.
+    delete_query = """
+        DELETE FROM "[vapi].DECK_MATCHUPS"
+        WHERE "EVENT_DATE" >= %s AND "EVENT_DATE" < %s
+    """
+    insert_query = """
+        INSERT INTO "[vapi].DECK_MATCHUPS" ("EVENT_DATE", "P1_DECK_ID", "P2_DECK_ID", "MATCHES", "WINS", "LOSSES", "DRAWS", "PROC_DT")
+        SELECT e."EVENT_DATE", m."P1_DECK_ID", m."P2_DECK_ID",
+            COUNT(*),
+            SUM(CASE WHEN m."MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN m."MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN COALESCE(m."MATCH_WINNER", '') NOT IN ('P1', 'P2') THEN 1 ELSE 0 END),
+            %s
+        FROM "[vapi].MATCHES" m
+        JOIN "[vapi].EVENTS" e
+        ON m."EVENT_ID" = e."EVENT_ID"
+        WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s
+        GROUP BY e."EVENT_DATE", m."P1_DECK_ID", m."P2_DECK_ID"
+    """
+    cursor.execute(delete_query, (start_date, end_date))
+    cursor.execute(insert_query, (proc_dt, start_date, end_date))
+    return cursor.rowcount
+
+def refresh_match_results(cursor, start_date, end_date, proc_dt):
+    # Rebuild the API read model (matches with deck names and event date) for the reloaded date window only.
+    delete_query = """
+        DELETE FROM "[vapi].MATCH_RESULTS"
+        WHERE "EVENT_DATE" >= %s AND "EVENT_DATE" < %s
+    """
+    insert_query = """
+        INSERT INTO "[vapi].MATCH_RESULTS" ("MATCH_ID", "P1", "P1_DECK_ID", "P1_ARCH", "P1_SUBARCH", "P1_WINS", "P2", "P2_DECK_ID", "P2_ARCH",
+            "P2_SUBARCH", "P2_WINS", "MATCH_WINNER", "EVENT_ID", "EVENT_DATE", "EVENT_TYPE_ID", "P1_ID", "P2_ID", "PROC_DT")
+        SELECT m."MATCH_ID", m."P1", m."P1_DECK_ID", b."ARCHETYPE", b."SUBARCHETYPE", m."P1_WINS", m."P2", m."P2_DECK_ID", c."ARCHETYPE",
+            c."SUBARCHETYPE", m."P2_WINS", m."MATCH_WINNER", m."EVENT_ID", e."EVENT_DATE", e."EVENT_TYPE_ID", m."P1_ID", m."P2_ID", %s
+        FROM "[vapi].MATCHES" m
+        JOIN "[vapi].VALID_DECKS" b
+        ON m."P1_DECK_ID" = b."DECK_ID"
+        JOIN "[vapi].VALID_DECKS" c
+        ON m."P2_DECK_ID" = c."DECK_ID"
+        JOIN "[vapi].EVENTS" e
+        ON m."EVENT_ID" = e."EVENT_ID"
+        WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" < %s
+    """
+    cursor.execute(delete_query, (start_date, end_date))
+    cursor.execute(insert_query, (proc_dt, start_date, end_date))
+    return cursor.rowcount
+
+def refresh_player_activity(cursor, proc_dt):
+    # Per-player totals for /players/search/. Small enough (one row per player) to rebuild in full on every load.
+    delete_query = """
+        DELETE FROM "[vapi].PLAYER_ACTIVITY"
+    """
+    insert_query = """
+        INSERT INTO "[vapi].PLAYER_ACTIVITY" ("P1_ID", "EVENTS_PLAYED", "MATCHES_PLAYED", "FIRST_EVENT_DATE", "LAST_EVENT_DATE", "PROC_DT")
+        SELECT r."P1_ID", COUNT(*), SUM(r."WINS" + r."LOSSES"), MIN(r."EVENT_DATE"), MAX(r."EVENT_DATE"), %s
+        FROM "[vapi].PLAYER_EVENT_RECORDS" r
+        GROUP BY r."P1_ID"
+    """
+    cursor.execute(delete_query)
+    cursor.execute(insert_query, (proc_dt,))
+    return cursor.rowcount
+
 def match_insert(
     df_matches=None,
     df_events=None,
@@ -913,6 +1069,14 @@ def match_insert(
                     standing_rej.append(values + ('E', str(e)))
                     continue
 
+        # Refresh aggregates derived from the rows just loaded (same transaction as the load).
+        players_added = refresh_players(cursor, start_date, end_date, proc_dt)
+        event_players_refreshed = refresh_event_total_players(cursor, start_date, end_date)
+        records_refreshed = refresh_player_event_records(cursor, start_date, end_date, proc_dt)
+        matchups_refreshed = refresh_deck_matchups(cursor, start_date, end_date, proc_dt)
+        players_refreshed = refresh_player_activity(cursor, proc_dt)
+        match_results_refreshed = refresh_match_results(cursor, start_date, end_date, proc_dt)
+
         # Export DB-mapped IDs for easier reconciliation against inserted data.
         if export_debug_excels:
             project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -949,6 +1113,12 @@ def match_insert(
             f"inserted={standings_inserted} skipped_parse={standings_skipped_parse} "
             f"skipped_insert={standings_skipped_insert} skipped_total={standings_skipped_total}"
         )
+        print(f"  PLAYERS added={players_added}")
+        print(f"  EVENTS TOTAL_PLAYERS refreshed={event_players_refreshed}")
+        print(f"  PLAYER_EVENT_RECORDS refreshed={records_refreshed}")
+        print(f"  DECK_MATCHUPS refreshed={matchups_refreshed}")
+        print(f"  PLAYER_ACTIVITY refreshed={players_refreshed}")
+        print(f"  MATCH_RESULTS refreshed={match_results_refreshed}")
 
         conn.commit()
     except Exception as e:
@@ -1101,11 +1271,13 @@ def insert_load_stats(load_report,event_rej,match_rej,standing_rej):
         traceback.print_exc() 
         if conn:
             conn.rollback()
+        load_rpt_id = 0
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+    return load_rpt_id
 
 def test(df_matches, df_events):
     # Should have 8 Match Rejections (should not be loaded):
@@ -0,0 +1,73 @@
+from flask import has_request_context, request
+import os
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+    )
+except ImportError:
+    Counter = None
+
+# With PROMETHEUS_MULTIPROC_DIR set (before the app is imported), every Gunicorn worker writes its samples
+# to that directory and /metrics aggregates all of them.
+enabled = Counter is not None
+
+if enabled:
+    REQUEST_LATENCY = Histogram(
+        "vapi_request_duration_seconds", "Request latency by route, method and status.",
+        ["route", "method", "status"],
+    )
+    IN_FLIGHT = Gauge(
+        "vapi_requests_in_progress", "Requests currently being handled.",
+        multiprocess_mode="livesum",
+    )
+    RATE_LIMITED = Counter(
+        "vapi_rate_limited_total", "Requests rejected by the rate limiter.",
+        ["route"],
+    )
+    QUERY_SECONDS = Histogram(
+        "vapi_query_seconds", "Time inside run_select_query: phase=db (execute + fetch) or phase=serialize (rows to dicts).",
+        ["route", "phase"],
+    )
+    QUERY_ROWS = Histogram(
+        "vapi_query_rows", "Rows returned per query.",
+        ["route"],
+        buckets=(0, 1, 10, 100, 1000, 10000, 100000, float("inf")),
+    )
+
+def current_route():
+    # The URL rule (e.g. /matches/<int:match_id>/) keeps label cardinality bounded.
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "none"
+
+def observe_request(route, method, status, seconds):
+    if not enabled:
+        return
+    if seconds is not None:
+        REQUEST_LATENCY.labels(route, method, str(status)).observe(seconds)
+    if status == 429:
+        RATE_LIMITED.labels(route).inc()
+
+def observe_query(db_seconds, serialize_seconds, rows, route=None):
+    # Streamed responses finish after the request context is gone; they pass the route captured up front.
+    if not enabled:
+        return
+    route = route or current_route()
+    QUERY_SECONDS.labels(route, "db").observe(db_seconds)
+    if serialize_seconds is not None:
+        QUERY_SECONDS.labels(route, "serialize").observe(serialize_seconds)
+    QUERY_ROWS.labels(route).observe(rows)
+
+def render():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid):
+    """Call from Gunicorn's child_exit hook so a dead worker's in-flight gauge is dropped."""
+    if enabled and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,126 @@
+from psycopg2.extras import execute_values
+import threading
+import logging
+import atexit
+import queue
+import time
+import os
+
+insert_api_logging_query = '''
+INSERT INTO "[vapi].API_LOGGING_STATS" ("ENDPOINT", "METHOD", "QUERY_PARAMS", "STATUS_CODE", "CLIENT_IP", "USER_AGENT",
+    "REQUEST_START", "REQUEST_END", "RESPONSE_TIME_MS")
+VALUES %s
+'''
+
+_stop = object()
+
+logger = logging.getLogger(__name__)
+
+class RequestLogWriter:
+    """Queues API_LOGGING_STATS rows in memory and inserts them in batches from a background thread.
+
+    log() never blocks: when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, connect, max_queue=10000, batch_size=500, flush_seconds=2.0, shutdown_timeout=5.0):
+        self._connect = connect
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._conn = None
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        atexit.register(self.close)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _ensure_started(self):
+        # Threads do not survive fork; each Gunicorn worker starts its own writer on first use.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._conn = None
+            self._thread = threading.Thread(target=self._run, name="vapi-request-log", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def log(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("dropped")
+            return
+        self._count("queued")
+
+    def _run(self):
+        q = self._queue
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _stop:
+                self._write(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_seconds
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self._connect()
+            with self._conn.cursor() as cursor:
+                execute_values(cursor, insert_api_logging_query, batch, page_size=self.batch_size)
+            self._conn.commit()
+            self._count("written", len(batch))
+            self._count("batches")
+        except Exception:
+            # Logging must never take the API down; the batch is discarded and counted.
+            logger.exception("Error writing %d row(s) to API_LOGGING_STATS", len(batch))
+            self._count("failed", len(batch))
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def close(self):
+        """Flush queued records and stop the writer (registered with atexit for worker shutdown)."""
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_stop, timeout=self.shutdown_timeout)
+        except queue.Full:
+            return
+        self._thread.join(self.shutdown_timeout)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_size"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        stats["max_queue"] = self.max_queue
+        stats["batch_size"] = self.batch_size
+        return stats
@@ -0,0 +1,178 @@
+import sqlite3
+import threading
+import json
+import time
+import os
+from collections import OrderedDict
+
+# Separates the data version from the path in cache keys; versions themselves contain "|".
+version_separator = "\x1f"
+
+def normalize_args(args):
+    return "&".join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+
+class MemoryBackend:
+    """Per-worker LRU bounded by entry count and total body bytes."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry[2])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[2])
+                self.evictions += 1
+
+    def clear(self, keep_version=None):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+class SQLiteBackend:
+    """LRU store in a local SQLite file so every Gunicorn worker on the host shares hits."""
+
+    def __init__(self, path, max_entries=1024, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.evictions = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache(accessed)")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections are not shared across threads or forked processes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT status, headers, body FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE response_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return (row[0], json.loads(row[1]), bytes(row[2]))
+
+    def set(self, key, entry):
+        size = len(entry[2])
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        version = key.split(version_separator, 1)[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, version, status, headers, body, size, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, version, entry[0], json.dumps(entry[1]), sqlite3.Binary(entry[2]), size, time.time()),
+        )
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            oldest = conn.execute("SELECT key, size FROM response_cache ORDER BY accessed ASC LIMIT 1").fetchone()
+            if oldest is None:
+                break
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (oldest[0],))
+            count -= 1
+            total -= oldest[1]
+            self.evictions += 1
+        conn.commit()
+
+    def clear(self, keep_version=None):
+        conn = self._conn()
+        if keep_version is None:
+            conn.execute("DELETE FROM response_cache")
+        else:
+            conn.execute("DELETE FROM response_cache WHERE version <> ?", (keep_version,))
+        conn.commit()
+
+    def info(self):
+        count, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        return {"backend": "sqlite", "path": self.path, "entries": count, "bytes": total,
+                "max_entries": self.max_entries, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+class ResponseCache:
+    """Response cache whose entries are tied to the latest ETL load version."""
+
+    def __init__(self, backend, get_version):
+        self.backend = backend
+        self._get_version = get_version
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def version(self):
+        version = str(self._get_version())
+        if version != self._version:
+            # A new load landed; drop everything cached against the previous version.
+            if self._version is not None:
+                self._count("invalidations")
+            self._version = version
+            self.backend.clear(keep_version=version)
+        return version
+
+    def make_key(self, path, args):
+        return f"{self.version()}{version_separator}{path}?{normalize_args(args)}"
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        self._count("hits" if entry is not None else "misses")
+        return entry
+
+    def set(self, key, status, headers, body):
+        self.backend.set(key, (status, headers, body))
+        self._count("stores")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["version"] = self._version
+        stats.update(self.backend.info())
+        return stats
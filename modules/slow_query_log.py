@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+import threading
+import hashlib
+import logging
+import random
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+class SlowQueryLog:
+    """Appends queries slower than threshold_ms to a JSON Lines file, with an EXPLAIN plan for a sampled fraction."""
+
+    def __init__(self, path, threshold_ms=1000.0, explain_sample=0.0):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.explain_sample = explain_sample
+        self._lock = threading.Lock()
+
+    def explain(self, cursor, query, params):
+        # EXPLAIN ANALYZE runs the statement a second time; only read-only API queries come through here.
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        plan = cursor.fetchone()[0]
+        return plan[0] if isinstance(plan, list) else plan
+
+    def record(self, cursor, query, params, seconds, rows, route):
+        ms = seconds * 1000
+        if ms < self.threshold_ms:
+            return
+        # The query itself succeeded: a failed EXPLAIN or log write is reported here and never reaches the request.
+        try:
+            self._record(cursor, query, params, ms, rows, route)
+        except Exception:
+            logger.exception("Error writing slow query log %s", self.path)
+
+    def _record(self, cursor, query, params, ms, rows, route):
+        query_text = " ".join(query.split())
+        entry = {
+            "TS": datetime.now(timezone.utc).isoformat(),
+            "ROUTE": route,
+            "PID": os.getpid(),
+            "QUERY_ID": hashlib.sha1(query_text.encode()).hexdigest()[:16],
+            "ELAPSED_MS": round(ms, 2),
+            "ROWS": rows,
+            "QUERY": query_text,
+            "PARAMS": params,
+        }
+        if self.explain_sample > 0 and random.random() < self.explain_sample:
+            try:
+                plan = self.explain(cursor, query, params)
+                entry["PLAN_EXECUTION_MS"] = plan.get("Execution Time")
+                entry["PLAN"] = plan
+            except Exception as e:
+                entry["PLAN_ERROR"] = str(e)
+                try:
+                    cursor.connection.rollback()
+                except Exception:
+                    # The pool discards a connection it cannot roll back when it is returned.
+                    logger.exception("Error rolling back after EXPLAIN")
+
+        line = json.dumps(entry, default=str) + "\n"
+        # One write per entry on an O_APPEND file, so lines from different workers do not interleave.
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
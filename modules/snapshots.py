@@ -0,0 +1,253 @@
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+from itertools import groupby
+from urllib.parse import quote
+import hashlib
+import logging
+import shutil
+import gzip
+import json
+import uuid
+import os
+from modules.match_import import get_connection
+from modules import export
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout under SNAPSHOT_DIR:
+#   loads/<LOAD_RPT_ID>/manifest.json
+#   loads/<LOAD_RPT_ID>/events/<EVENT_ID>.json
+#   loads/<LOAD_RPT_ID>/players/<url-quoted PLAYER_KEY>.json
+#   loads/<LOAD_RPT_ID>/matches.parquet (matches.csv.gz without pyarrow)
+#   current -> loads/<LOAD_RPT_ID>   (swapped atomically after each load)
+
+# Rows per server-side fetch. Memory is bounded by one fetch batch, one event's or one player's rows, the event list
+# (one row per event) and the manifest's player file map (one entry per player); no table is read into memory whole.
+fetch_size = int(os.getenv("SNAPSHOT_FETCH_SIZE", 50000))
+
+events_query = """
+    SELECT e."EVENT_ID", e."EVENT_DATE", c."FORMAT", c."EVENT_TYPE", e."TOTAL_PLAYERS"
+    FROM "[vapi].EVENTS" e
+    JOIN "[vapi].VALID_EVENT_TYPES" c
+    ON e."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
+    WHERE e."TOTAL_PLAYERS" > 0
+    ORDER BY e."EVENT_ID"
+"""
+standings_query = """
+    SELECT es."EVENT_ID", e."EVENT_DATE", ves."EVENT_TYPE", es."EVENT_RANK", es."P1", a."WINS", a."LOSSES", es."BYES"
+    FROM "[vapi].EVENTS" e
+    JOIN "[vapi].EVENT_STANDINGS" es
+    ON es."EVENT_ID" = e."EVENT_ID"
+    JOIN "[vapi].VALID_EVENT_TYPES" ves
+    ON ves."EVENT_TYPE_ID" = e."EVENT_TYPE_ID"
+    JOIN "[vapi].PLAYER_EVENT_RECORDS" a
+    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1_ID" = a."P1_ID"
+    ORDER BY es."EVENT_ID", es."EVENT_RANK"
+"""
+# Same columns and order as /matches/event/<id>/, grouped by event.
+event_matches_query = """
+    SELECT a."EVENT_ID", a."MATCH_ID", a."P1", a."P1_ARCH", a."P1_SUBARCH", a."P1_WINS", a."P2", a."P2_ARCH", a."P2_SUBARCH", a."P2_WINS",
+    a."MATCH_WINNER", a."EVENT_DATE"
+    FROM "[vapi].MATCH_RESULTS" a
+    ORDER BY a."EVENT_ID", a."MATCH_ID" DESC, a."P1"
+"""
+matches_query = """
+    SELECT a."MATCH_ID", a."EVENT_ID", a."EVENT_DATE", a."P1", a."P1_ID", a."P1_DECK_ID", a."P1_ARCH", a."P1_SUBARCH", a."P1_WINS",
+    a."P2", a."P2_ID", a."P2_DECK_ID", a."P2_ARCH", a."P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER"
+    FROM "[vapi].MATCH_RESULTS" a
+    ORDER BY a."MATCH_ID", a."P1"
+"""
+# Same rows as /events/player/<P1>/, plus the player's final rank, one group per PLAYERS row. Grouped on P1_ID like
+# the API, so every spelling of a name that normalizes to the same player lands in one file.
+player_events_query = """
+    SELECT p."PLAYER_KEY", p."PLAYER_NAME", a."EVENT_ID", a."EVENT_DATE", c."FORMAT", c."EVENT_TYPE",
+        MAX(a."P1_ARCH") AS "ARCHETYPE", MAX(a."P1_SUBARCH") AS "SUBARCHETYPE",
+        COUNT(CASE WHEN a."MATCH_WINNER" = 'P1' THEN 1 END) AS "WINS",
+        COUNT(CASE WHEN a."MATCH_WINNER" = 'P2' THEN 1 END) AS "LOSSES",
+        r."EVENT_RANK"
+    FROM "[vapi].MATCH_RESULTS" a
+    JOIN "[vapi].PLAYERS" p
+    ON a."P1_ID" = p."PLAYER_ID"
+    JOIN "[vapi].VALID_EVENT_TYPES" c
+    ON a."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
+    LEFT JOIN "[vapi].PLAYER_EVENT_RECORDS" r
+    ON a."EVENT_ID" = r."EVENT_ID" AND a."P1_ID" = r."P1_ID"
+    GROUP BY p."PLAYER_KEY", p."PLAYER_NAME", a."EVENT_ID", a."EVENT_DATE", c."FORMAT", c."EVENT_TYPE", r."EVENT_RANK"
+    ORDER BY p."PLAYER_KEY", a."EVENT_ID" DESC
+"""
+load_report_query = """
+    SELECT "LOAD_RPT_ID", "START_DATE", "END_DATE", "PROC_DT"
+    FROM "[vapi].LOAD_REPORTS"
+    WHERE "LOAD_RPT_ID" = %s
+"""
+
+def _json_default(value):
+    # Dates are written the way the API returns them (HTTP dates, e.g. "Sun, 25 Aug 2024 00:00:00 GMT").
+    if isinstance(value, datetime):
+        return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+    if isinstance(value, date):
+        return format_datetime(datetime(value.year, value.month, value.day, tzinfo=timezone.utc), usegmt=True)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+def stream_batches(conn, query, params=()):
+    # Named (server-side) cursor, as in the API's stream_select_rows: yields (cursor.description, rows) per fetch,
+    # the first batch even when it is empty.
+    with conn.cursor(name=f"vapi_snapshot_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(query, params)
+        rows = cursor.fetchmany(fetch_size)
+        yield cursor.description, rows
+        while rows:
+            rows = cursor.fetchmany(fetch_size)
+            if rows:
+                yield cursor.description, rows
+
+def stream_records(conn, query, params=()):
+    for description, rows in stream_batches(conn, query, params):
+        column_names = [column.name for column in description]
+        for row in rows:
+            yield dict(zip(column_names, row))
+
+def rows_by_event(records, event_ids):
+    # records and event_ids are both ordered by EVENT_ID; yields one event's rows (without EVENT_ID) per event id.
+    groups = groupby(records, key=lambda row: row["EVENT_ID"])
+    current = next(groups, None)
+    for event_id in event_ids:
+        while current is not None and current[0] < event_id:
+            current = next(groups, None)
+        if current is not None and current[0] == event_id:
+            yield [{name: value for name, value in row.items() if name != "EVENT_ID"} for row in current[1]]
+            current = next(groups, None)
+        else:
+            yield []
+
+def player_file_name(player_key):
+    return quote(player_key, safe="") + ".json"
+
+def write_event_files(conn, events, build_dir):
+    event_ids = [event["EVENT_ID"] for event in events]
+    matches = rows_by_event(stream_records(conn, event_matches_query), event_ids)
+    standings = rows_by_event(stream_records(conn, standings_query), event_ids)
+    standings_written = 0
+    for event, event_matches, event_standings in zip(events, matches, standings):
+        _write_json(os.path.join(build_dir, "events", f"{event['EVENT_ID']}.json"), {
+            "event": event,
+            "standings": event_standings,
+            "matches": event_matches,
+        })
+        standings_written += len(event_standings)
+    return standings_written
+
+def write_player_files(conn, build_dir):
+    players = {}
+    for player_key, rows in groupby(stream_records(conn, player_events_query), key=lambda row: row["PLAYER_KEY"]):
+        rows = list(rows)
+        file_name = player_file_name(player_key)
+        players[rows[0]["PLAYER_NAME"]] = file_name
+        _write_json(os.path.join(build_dir, "players", file_name), {
+            "player": rows[0]["PLAYER_NAME"],
+            "events": [{name: value for name, value in row.items() if name not in ("PLAYER_KEY", "PLAYER_NAME")} for row in rows],
+        })
+    return players
+
+def write_matches_file(conn, version_dir):
+    # Streamed through the /export/ encoder: one Parquet row group per fetch, or gzip CSV without pyarrow.
+    counted = {"rows": 0}
+    def batches():
+        for description, rows in stream_batches(conn, matches_query):
+            counted["rows"] += len(rows)
+            yield description, rows
+
+    if export.pa is not None:
+        path = os.path.join(version_dir, "matches.parquet")
+        with open(path, "wb") as f:
+            for chunk in export.generate(batches(), "parquet"):
+                f.write(chunk)
+    else:
+        path = os.path.join(version_dir, "matches.csv.gz")
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            for chunk in export.generate(batches(), "csv"):
+                f.write(chunk)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return os.path.basename(path), digest.hexdigest(), counted["rows"]
+
+def swap_current(snapshot_dir, load_rpt_id):
+    # A symlink renamed over the old one: readers see either the previous or the new snapshot, never a mix.
+    tmp_link = os.path.join(snapshot_dir, f".current.{os.getpid()}")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.join("loads", str(load_rpt_id)), tmp_link)
+    os.replace(tmp_link, os.path.join(snapshot_dir, "current"))
+
+def prune_snapshots(snapshot_dir, keep):
+    loads_dir = os.path.join(snapshot_dir, "loads")
+    current = os.path.basename(os.path.realpath(os.path.join(snapshot_dir, "current")))
+    versions = sorted((name for name in os.listdir(loads_dir) if name.isdigit()), key=int, reverse=True)
+    for name in versions[keep:]:
+        if name != current:
+            shutil.rmtree(os.path.join(loads_dir, name), ignore_errors=True)
+    # Build directories left behind by a run that died mid-write (one import writes snapshots at a time).
+    for name in os.listdir(loads_dir):
+        if name.startswith(".build-"):
+            shutil.rmtree(os.path.join(loads_dir, name), ignore_errors=True)
+
+def write_snapshot(load_rpt_id, snapshot_dir=None, keep=None):
+    """Write the post-load snapshot for load_rpt_id and point SNAPSHOT_DIR/current at it."""
+    snapshot_dir = snapshot_dir or os.getenv("SNAPSHOT_DIR")
+    keep = keep if keep is not None else int(os.getenv("SNAPSHOT_KEEP", 3))
+    if not snapshot_dir:
+        logger.warning("SNAPSHOT_DIR is not set; skipping snapshot.")
+        return None
+
+    loads_dir = os.path.join(snapshot_dir, "loads")
+    version_dir = os.path.join(loads_dir, str(load_rpt_id))
+    build_dir = os.path.join(loads_dir, f".build-{load_rpt_id}-{os.getpid()}")
+    conn = get_connection()
+    try:
+        # One read-only REPEATABLE READ transaction, so every file is built from the same committed load.
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        os.makedirs(os.path.join(build_dir, "events"), exist_ok=True)
+        os.makedirs(os.path.join(build_dir, "players"), exist_ok=True)
+
+        load = next(stream_records(conn, load_report_query, (load_rpt_id,)), None) or {"LOAD_RPT_ID": load_rpt_id}
+        events = list(stream_records(conn, events_query))
+        standings_written = write_event_files(conn, events, build_dir)
+        players = write_player_files(conn, build_dir)
+        matches_file, matches_sha256, matches_written = write_matches_file(conn, build_dir)
+        manifest = {
+            "LOAD_RPT_ID": load_rpt_id,
+            "LOAD": load,
+            "GENERATED_AT": datetime.now(timezone.utc),
+            "COUNTS": {"EVENTS": len(events), "PLAYERS": len(players), "MATCHES": matches_written, "STANDINGS": standings_written},
+            "FILES": {
+                "matches": {"path": matches_file, "sha256": matches_sha256},
+                "events": "events/{EVENT_ID}.json",
+                "players": players,
+            },
+        }
+        _write_json(os.path.join(build_dir, "manifest.json"), manifest)
+
+        if os.path.exists(version_dir):
+            shutil.rmtree(version_dir)
+        os.replace(build_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+    swap_current(snapshot_dir, load_rpt_id)
+    prune_snapshots(snapshot_dir, keep)
+
+    logger.info(
+        "Snapshot written. load_rpt_id=%s, events=%d, players=%d, matches=%d, path=%s",
+        load_rpt_id, len(events), len(players), matches_written, version_dir,
+    )
+    return version_dir
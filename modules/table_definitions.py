@@ -11,6 +11,7 @@ credentials = [os.getenv("DB_HOST"), os.getenv("DB_PORT"), os.getenv("DB_USER"),
 # EV_REJ_ID     = 16000000000
 # MATCH_REJ_ID  = 17000000000
 # EV_STD_REJ_ID = 18000000000
+# PLAYER_ID     = 19000000000
     
 def conn(query, vars=()):
     print(f"Connecting to database: {credentials[0]}:{credentials[1]}/{credentials[4]}")
@@ -75,10 +76,24 @@ def create_new_tables():
         "EVENT_ID" BIGINT GENERATED ALWAYS AS IDENTITY (START WITH 12000000000) PRIMARY KEY,
         "EVENT_DATE" DATE,
         "EVENT_TYPE_ID" BIGINT,
+        "TOTAL_PLAYERS" INT,
         "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
         FOREIGN KEY ("EVENT_TYPE_ID") REFERENCES "[vapi].VALID_EVENT_TYPES"("EVENT_TYPE_ID") ON UPDATE CASCADE
     );
     """
+    # Adds TOTAL_PLAYERS to EVENTS tables created before the column existed and backfills it with the count
+    # match_insert writes: distinct player ids on either side of the event's stored matches. Runs after the PLAYERS backfill.
+    migrate_events_total_players_query = """
+    ALTER TABLE "[vapi].EVENTS" ADD COLUMN IF NOT EXISTS "TOTAL_PLAYERS" INT;
+    UPDATE "[vapi].EVENTS" e
+    SET "TOTAL_PLAYERS" = (
+        SELECT COUNT(DISTINCT x."PLAYER_ID")
+        FROM "[vapi].MATCHES" m
+        CROSS JOIN LATERAL unnest(ARRAY[m."P1_ID", m."P2_ID"]) AS x("PLAYER_ID")
+        WHERE m."EVENT_ID" = e."EVENT_ID"
+    )
+    WHERE e."TOTAL_PLAYERS" IS NULL;
+    """
     create_matches_query = """
     CREATE TABLE IF NOT EXISTS "[vapi].MATCHES" (
         "MATCH_ID" BIGINT GENERATED ALWAYS AS IDENTITY (START WITH 11000000000),
@@ -92,11 +107,15 @@ def create_new_tables():
         "P1_NOTE" VARCHAR(100),
         "P2_NOTE" VARCHAR(100),
         "EVENT_ID" BIGINT,
+        "P1_ID" BIGINT,
+        "P2_ID" BIGINT,
         "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
         PRIMARY KEY ("MATCH_ID", "P1"),
         FOREIGN KEY ("P1_DECK_ID") REFERENCES "[vapi].VALID_DECKS"("DECK_ID") ON UPDATE CASCADE,
         FOREIGN KEY ("P2_DECK_ID") REFERENCES "[vapi].VALID_DECKS"("DECK_ID") ON UPDATE CASCADE,
-        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE
+        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE,
+        FOREIGN KEY ("P1_ID") REFERENCES "[vapi].PLAYERS"("PLAYER_ID"),
+        FOREIGN KEY ("P2_ID") REFERENCES "[vapi].PLAYERS"("PLAYER_ID")
     );
     """
     create_ranks_query = """
@@ -105,11 +124,20 @@ def create_new_tables():
         "P1" VARCHAR(30),
         "BYES" INT,
         "EVENT_RANK" INT,
+        "P1_ID" BIGINT,
         "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
         PRIMARY KEY ("EVENT_ID", "EVENT_RANK"),
-        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE
+        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE,
+        FOREIGN KEY ("P1_ID") REFERENCES "[vapi].PLAYERS"("PLAYER_ID")
     );
     """
+    # Adds the player id columns to MATCHES and EVENT_STANDINGS tables created before they existed; the PLAYERS
+    # backfill fills them.
+    migrate_player_id_columns_query = """
+    ALTER TABLE "[vapi].MATCHES" ADD COLUMN IF NOT EXISTS "P1_ID" BIGINT REFERENCES "[vapi].PLAYERS"("PLAYER_ID");
+    ALTER TABLE "[vapi].MATCHES" ADD COLUMN IF NOT EXISTS "P2_ID" BIGINT REFERENCES "[vapi].PLAYERS"("PLAYER_ID");
+    ALTER TABLE "[vapi].EVENT_STANDINGS" ADD COLUMN IF NOT EXISTS "P1_ID" BIGINT REFERENCES "[vapi].PLAYERS"("PLAYER_ID");
+    """
     create_load_reports_query = """
     CREATE TABLE IF NOT EXISTS "[vapi].LOAD_REPORTS" (
         "LOAD_RPT_ID" BIGINT GENERATED ALWAYS AS IDENTITY (START WITH 15000000000) PRIMARY KEY,
@@ -180,27 +208,216 @@ def create_new_tables():
         FOREIGN KEY ("LOAD_RPT_ID") REFERENCES "[vapi].LOAD_REPORTS"("LOAD_RPT_ID") ON UPDATE CASCADE ON DELETE CASCADE
     );
     """
+    create_player_event_records_query = """
+    CREATE TABLE IF NOT EXISTS "[vapi].PLAYER_EVENT_RECORDS" (
+        "EVENT_ID" BIGINT,
+        "P1_ID" BIGINT,
+        "WINS" INT,
+        "LOSSES" INT,
+        "EVENT_DATE" DATE,
+        "EVENT_RANK" INT,
+        "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY ("EVENT_ID", "P1_ID"),
+        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE,
+        FOREIGN KEY ("P1_ID") REFERENCES "[vapi].PLAYERS"("PLAYER_ID")
+    );
+    CREATE INDEX IF NOT EXISTS idx_player_event_records_event_date ON "[vapi].PLAYER_EVENT_RECORDS"("EVENT_DATE");
+    """
+    # Backfills events loaded before PLAYER_EVENT_RECORDS existed; match_insert maintains it afterwards.
+    populate_player_event_records_query = """
+    INSERT INTO "[vapi].PLAYER_EVENT_RECORDS" ("EVENT_ID", "P1_ID", "WINS", "LOSSES", "EVENT_DATE", "EVENT_RANK", "PROC_DT")
+    SELECT m."EVENT_ID", m."P1_ID",
+        SUM(CASE WHEN m."MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN m."MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END),
+        e."EVENT_DATE",
+        (
+            SELECT MIN(es."EVENT_RANK")
+            FROM "[vapi].EVENT_STANDINGS" es
+            WHERE es."EVENT_ID" = m."EVENT_ID" AND es."P1_ID" = m."P1_ID"
+        ),
+        NOW()
+    FROM "[vapi].MATCHES" m
+    JOIN "[vapi].EVENTS" e
+    ON m."EVENT_ID" = e."EVENT_ID"
+    WHERE m."P1_ID" IS NOT NULL
+    GROUP BY m."EVENT_ID", m."P1_ID", e."EVENT_DATE"
+    ON CONFLICT ("EVENT_ID", "P1_ID") DO NOTHING;
+    """
+    create_deck_matchups_query = """
+    CREATE TABLE IF NOT EXISTS "[vapi].DECK_MATCHUPS" (
+        "EVENT_DATE" DATE,
+        "P1_DECK_ID" BIGINT,
+        "P2_DECK_ID" BIGINT,
+        "MATCHES" INT,
+        "WINS" INT,
+        "LOSSES" INT,
+        "DRAWS" INT,
+        "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY ("EVENT_DATE", "P1_DECK_ID", "P2_DECK_ID"),
+        FOREIGN KEY ("P1_DECK_ID") REFERENCES "[vapi].VALID_DECKS"("DECK_ID") ON UPDATE CASCADE,
+        FOREIGN KEY ("P2_DECK_ID") REFERENCES "[vapi].VALID_DECKS"("DECK_ID") ON UPDATE CASCADE
+    );
+    """
+    populate_deck_matchups_query = """
+    INSERT INTO "[vapi].DECK_MATCHUPS" ("EVENT_DATE", "P1_DECK_ID", "P2_DECK_ID", "MATCHES", "WINS", "LOSSES", "DRAWS", "PROC_DT")
+    SELECT e."EVENT_DATE", m."P1_DECK_ID", m."P2_DECK_ID",
+        COUNT(*),
+        SUM(CASE WHEN m."MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN m."MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN COALESCE(m."MATCH_WINNER", '') NOT IN ('P1', 'P2') THEN 1 ELSE 0 END),
+        NOW()
+    FROM "[vapi].MATCHES" m
+    JOIN "[vapi].EVENTS" e
+    ON m."EVENT_ID" = e."EVENT_ID"
+    WHERE e."EVENT_DATE" IS NOT NULL
+    GROUP BY e."EVENT_DATE", m."P1_DECK_ID", m."P2_DECK_ID"
+    ON CONFLICT ("EVENT_DATE", "P1_DECK_ID", "P2_DECK_ID") DO NOTHING;
+    """
+    create_player_activity_query = """
+    CREATE TABLE IF NOT EXISTS "[vapi].PLAYER_ACTIVITY" (
+        "P1_ID" BIGINT PRIMARY KEY,
+        "EVENTS_PLAYED" INT,
+        "MATCHES_PLAYED" INT,
+        "FIRST_EVENT_DATE" DATE,
+        "LAST_EVENT_DATE" DATE,
+        "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
+        FOREIGN KEY ("P1_ID") REFERENCES "[vapi].PLAYERS"("PLAYER_ID")
+    );
+    """
+    # Backfills players loaded before PLAYER_ACTIVITY existed; match_insert rebuilds it on every load.
+    populate_player_activity_query = """
+    INSERT INTO "[vapi].PLAYER_ACTIVITY" ("P1_ID", "EVENTS_PLAYED", "MATCHES_PLAYED", "FIRST_EVENT_DATE", "LAST_EVENT_DATE", "PROC_DT")
+    SELECT r."P1_ID", COUNT(*), SUM(r."WINS" + r."LOSSES"), MIN(r."EVENT_DATE"), MAX(r."EVENT_DATE"), NOW()
+    FROM "[vapi].PLAYER_EVENT_RECORDS" r
+    GROUP BY r."P1_ID"
+    ON CONFLICT ("P1_ID") DO NOTHING;
+    """
+    # Player dimension: one row per normalized name (upper-cased, trimmed, as the ETL compares players).
+    create_players_query = """
+    CREATE TABLE IF NOT EXISTS "[vapi].PLAYERS" (
+        "PLAYER_ID" BIGINT GENERATED ALWAYS AS IDENTITY (START WITH 19000000000) PRIMARY KEY,
+        "PLAYER_NAME" VARCHAR(30),
+        "PLAYER_KEY" VARCHAR(30) NOT NULL,
+        "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
+        CONSTRAINT unique_player_key UNIQUE ("PLAYER_KEY")
+    );
+    CREATE INDEX IF NOT EXISTS idx_players_player_key_pattern ON "[vapi].PLAYERS"("PLAYER_KEY" text_pattern_ops);
+    """
+    # Backfills PLAYERS and the id columns for rows loaded before they existed.
+    populate_players_query = """
+    INSERT INTO "[vapi].PLAYERS" ("PLAYER_NAME", "PLAYER_KEY", "PROC_DT")
+    SELECT DISTINCT ON (upper(trim(x."NAME"))) trim(x."NAME"), upper(trim(x."NAME")), NOW()
+    FROM (
+        SELECT "P1" AS "NAME" FROM "[vapi].MATCHES"
+        UNION ALL
+        SELECT "P2" FROM "[vapi].MATCHES"
+        UNION ALL
+        SELECT "P1" FROM "[vapi].EVENT_STANDINGS"
+    ) x
+    WHERE trim(x."NAME") <> ''
+    ORDER BY upper(trim(x."NAME")), x."NAME"
+    ON CONFLICT ("PLAYER_KEY") DO NOTHING;
+    UPDATE "[vapi].MATCHES" m
+    SET "P1_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(m."P1"))),
+        "P2_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(m."P2")))
+    WHERE m."P1_ID" IS NULL OR m."P2_ID" IS NULL;
+    UPDATE "[vapi].EVENT_STANDINGS" es
+    SET "P1_ID" = (SELECT p."PLAYER_ID" FROM "[vapi].PLAYERS" p WHERE p."PLAYER_KEY" = upper(trim(es."P1")))
+    WHERE es."P1_ID" IS NULL;
+    """
+    # API-shaped copy of MATCHES with deck names and event columns denormalized; the match endpoints read only this table.
+    create_match_results_query = """
+    CREATE TABLE IF NOT EXISTS "[vapi].MATCH_RESULTS" (
+        "MATCH_ID" BIGINT,
+        "P1" VARCHAR(30),
+        "P1_ID" BIGINT,
+        "P1_DECK_ID" BIGINT,
+        "P1_ARCH" VARCHAR(30),
+        "P1_SUBARCH" VARCHAR(30),
+        "P1_WINS" INT,
+        "P2" VARCHAR(30),
+        "P2_ID" BIGINT,
+        "P2_DECK_ID" BIGINT,
+        "P2_ARCH" VARCHAR(30),
+        "P2_SUBARCH" VARCHAR(30),
+        "P2_WINS" INT,
+        "MATCH_WINNER" VARCHAR(2),
+        "EVENT_ID" BIGINT,
+        "EVENT_DATE" DATE,
+        "EVENT_TYPE_ID" BIGINT,
+        "PROC_DT" TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY ("MATCH_ID", "P1"),
+        FOREIGN KEY ("EVENT_ID") REFERENCES "[vapi].EVENTS"("EVENT_ID") ON UPDATE CASCADE ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_match_results_event_date_match_id ON "[vapi].MATCH_RESULTS"("EVENT_DATE", "MATCH_ID");
+    CREATE INDEX IF NOT EXISTS idx_match_results_event_id ON "[vapi].MATCH_RESULTS"("EVENT_ID");
+    CREATE INDEX IF NOT EXISTS idx_match_results_p1_deck_id_match_id ON "[vapi].MATCH_RESULTS"("P1_DECK_ID", "MATCH_ID" DESC);
+    CREATE INDEX IF NOT EXISTS idx_match_results_p2_deck_id_match_id ON "[vapi].MATCH_RESULTS"("P2_DECK_ID", "MATCH_ID" DESC);
+    CREATE INDEX IF NOT EXISTS idx_match_results_event_type_id_match_id ON "[vapi].MATCH_RESULTS"("EVENT_TYPE_ID", "MATCH_ID" DESC);
+    CREATE INDEX IF NOT EXISTS idx_match_results_p1_id_match_id ON "[vapi].MATCH_RESULTS"("P1_ID", "MATCH_ID" DESC);
+    CREATE INDEX IF NOT EXISTS idx_match_results_p2_id_match_id ON "[vapi].MATCH_RESULTS"("P2_ID", "MATCH_ID" DESC);
+    """
+    # Backfills matches loaded before MATCH_RESULTS existed; match_insert rebuilds the reloaded date window afterwards.
+    populate_match_results_query = """
+    INSERT INTO "[vapi].MATCH_RESULTS" ("MATCH_ID", "P1", "P1_DECK_ID", "P1_ARCH", "P1_SUBARCH", "P1_WINS", "P2", "P2_DECK_ID", "P2_ARCH",
+        "P2_SUBARCH", "P2_WINS", "MATCH_WINNER", "EVENT_ID", "EVENT_DATE", "EVENT_TYPE_ID", "P1_ID", "P2_ID", "PROC_DT")
+    SELECT m."MATCH_ID", m."P1", m."P1_DECK_ID", b."ARCHETYPE", b."SUBARCHETYPE", m."P1_WINS", m."P2", m."P2_DECK_ID", c."ARCHETYPE",
+        c."SUBARCHETYPE", m."P2_WINS", m."MATCH_WINNER", m."EVENT_ID", e."EVENT_DATE", e."EVENT_TYPE_ID", m."P1_ID", m."P2_ID", NOW()
+    FROM "[vapi].MATCHES" m
+    JOIN "[vapi].VALID_DECKS" b
+    ON m."P1_DECK_ID" = b."DECK_ID"
+    JOIN "[vapi].VALID_DECKS" c
+    ON m."P2_DECK_ID" = c."DECK_ID"
+    JOIN "[vapi].EVENTS" e
+    ON m."EVENT_ID" = e."EVENT_ID"
+    ON CONFLICT ("MATCH_ID", "P1") DO NOTHING;
+    """
+    # Trigram index for fuzzy player search (prefix lookups use idx_players_player_key_pattern).
+    create_player_search_indexes = """
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_players_player_key_trgm ON "[vapi].PLAYERS" USING gin ("PLAYER_KEY" gin_trgm_ops);
+    """
     create_fkey_indexes = """
     CREATE INDEX IF NOT EXISTS idx_events_event_type_id ON "[vapi].EVENTS"("EVENT_TYPE_ID");
     CREATE INDEX IF NOT EXISTS idx_matches_p1_deck_id ON "[vapi].MATCHES"("P1_DECK_ID");
     CREATE INDEX IF NOT EXISTS idx_matches_p2_deck_id ON "[vapi].MATCHES"("P2_DECK_ID");
     CREATE INDEX IF NOT EXISTS idx_matches_event_id ON "[vapi].MATCHES"("EVENT_ID");
     CREATE INDEX IF NOT EXISTS idx_ranks_event_id ON "[vapi].EVENT_STANDINGS"("EVENT_ID");
+    CREATE INDEX IF NOT EXISTS idx_ranks_event_id_p1_id ON "[vapi].EVENT_STANDINGS"("EVENT_ID", "P1_ID");
     CREATE INDEX IF NOT EXISTS idx_event_rejections_load_rpt_id ON "[vapi].EVENT_REJECTIONS"("LOAD_RPT_ID");
     CREATE INDEX IF NOT EXISTS idx_match_rejections_load_rpt_id ON "[vapi].MATCH_REJECTIONS"("LOAD_RPT_ID");
     CREATE INDEX IF NOT EXISTS idx_ev_rank_rejections_load_rpt_id ON "[vapi].RANK_REJECTIONS"("LOAD_RPT_ID");
     """
+    # Date index for the /events/ range filter. The match endpoint filter indexes are created with MATCH_RESULTS,
+    # which the match endpoints read.
+    create_match_filter_indexes = """
+    CREATE INDEX IF NOT EXISTS idx_events_event_date ON "[vapi].EVENTS"("EVENT_DATE");
+    """
     operations = [
         ('"[vapi].VALID_DECKS"', create_valid_decks_query),
         ('"[vapi].VALID_EVENT_TYPES"', create_valid_event_types_query),
+        ('"[vapi].PLAYERS"', create_players_query),
         ('"[vapi].EVENTS"', create_events_query),
         ('"[vapi].MATCHES"', create_matches_query),
         ('"[vapi].EVENT_STANDINGS"', create_ranks_query),
+        ('"[vapi].MATCHES" / "[vapi].EVENT_STANDINGS" (player ids)', migrate_player_id_columns_query),
         ('"[vapi].LOAD_REPORTS"', create_load_reports_query),
         ('"[vapi].EVENT_REJECTIONS"', create_event_rejections_query),
         ('"[vapi].MATCH_REJECTIONS"', create_match_rejections_query),
         ('"[vapi].RANK_REJECTIONS"', create_ranks_rejections_query),
+        ('"[vapi].DECK_MATCHUPS"', create_deck_matchups_query),
+        ('"[vapi].MATCH_RESULTS"', create_match_results_query),
+        ('"[vapi].PLAYER_EVENT_RECORDS"', create_player_event_records_query),
+        ('"[vapi].PLAYER_ACTIVITY"', create_player_activity_query),
         ("INDEXES", create_fkey_indexes),
+        ("INDEXES (match filters)", create_match_filter_indexes),
+        ('"[vapi].PLAYERS" (backfill)', populate_players_query),
+        ('"[vapi].EVENTS"."TOTAL_PLAYERS" (backfill)', migrate_events_total_players_query),
+        ('"[vapi].DECK_MATCHUPS" (backfill)', populate_deck_matchups_query),
+        ('"[vapi].MATCH_RESULTS" (backfill)', populate_match_results_query),
+        ('"[vapi].PLAYER_EVENT_RECORDS" (backfill)', populate_player_event_records_query),
+        ('"[vapi].PLAYER_ACTIVITY" (backfill)', populate_player_activity_query),
+        ("INDEXES (player search)", create_player_search_indexes),
     ]
     total_ops = len(operations)
     for i, (name, query) in enumerate(operations, start=1):
@@ -222,4 +439,9 @@ def delete_all_tables():
     delete_table('LOAD_REPORTS')
     delete_table('EVENT_REJECTIONS')
     delete_table('MATCH_REJECTIONS')
-    delete_table('RANK_REJECTIONS')
\ No newline at end of file
+    delete_table('RANK_REJECTIONS')
+    delete_table('PLAYER_EVENT_RECORDS')
+    delete_table('DECK_MATCHUPS')
+    delete_table('PLAYER_ACTIVITY')
+    delete_table('MATCH_RESULTS')
+    delete_table('PLAYERS')
\ No newline at end of file
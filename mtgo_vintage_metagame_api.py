@@ -1,11 +1,30 @@
-from flask import Flask, jsonify, redirect, request, g
+from flask import Flask, Response, jsonify, redirect, request, g, make_response, send_from_directory
 from flask_stats import Stats
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import psycopg2
 import os
 import json
-from datetime import datetime, timedelta
+import time
+import tempfile
+import threading
+import hashlib
+import hmac
+import uuid
+from functools import wraps
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+from modules import db_pool
+from modules import response_cache as rc
+from modules.classification_cache import ClassificationCache
+from modules.json_provider import OrjsonProvider
+from modules import compression
+from modules import export
+from modules.request_log import RequestLogWriter
+from modules import metrics
+from modules.slow_query_log import SlowQueryLog
 
 required_db_env_vars = ("DB_HOST", "DB_PORT", "DB_USER", "DB_PASSWORD", "DB_NAME")
 missing_db_env_vars = [name for name in required_db_env_vars if not os.getenv(name)]
@@ -15,6 +34,8 @@ if missing_db_env_vars:
 credentials = [os.getenv("DB_HOST"), os.getenv("DB_PORT"), os.getenv("DB_USER"), os.getenv("DB_PASSWORD"), os.getenv("DB_NAME")]
 
 app = Flask(__name__)
+if os.getenv("API_JSON_PROVIDER", "orjson") == "orjson":
+    app.json = OrjsonProvider(app)
 stats = Stats(app)
 limiter = Limiter(key_func=get_remote_address, default_limits=['100 per minute'])
 limiter.init_app(app)
@@ -22,6 +43,20 @@ limiter.init_app(app)
 app.json.sort_keys = False
 page_size = 1000
 
+# Response compression: bodies at least API_COMPRESS_MIN_BYTES long are gzip/brotli encoded when accepted.
+compress_min_bytes = int(os.getenv("API_COMPRESS_MIN_BYTES", 1024))
+gzip_level = int(os.getenv("API_GZIP_LEVEL", 6))
+brotli_quality = int(os.getenv("API_BROTLI_QUALITY", 5))
+
+# Per-worker connection pool settings.
+pool_settings = {
+    "min_size": int(os.getenv("DB_POOL_MIN", 1)),
+    "max_size": int(os.getenv("DB_POOL_MAX", 10)),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    "max_age": float(os.getenv("DB_POOL_RECYCLE", 1800)),
+    "check_idle": float(os.getenv("DB_POOL_CHECK_IDLE", 30)),
+}
+
 def get_db_connection():
     conn = psycopg2.connect(
         host=credentials[0],
@@ -32,245 +67,742 @@ def get_db_connection():
     )
     return conn
 
+def get_db_pool():
+    # Created lazily so each Gunicorn worker builds its own pool after the fork.
+    return db_pool.get_pool(get_db_connection, **pool_settings)
+
+# Queries slower than API_SLOW_QUERY_MS are appended to a JSON Lines file; API_SLOW_QUERY_EXPLAIN_SAMPLE of them get a plan.
+slow_query_log = None
+if float(os.getenv("API_SLOW_QUERY_MS", 1000)) > 0:
+    slow_query_log = SlowQueryLog(
+        os.getenv("API_SLOW_QUERY_LOG", os.path.join(tempfile.gettempdir(), "vapi_slow_queries.jsonl")),
+        threshold_ms=float(os.getenv("API_SLOW_QUERY_MS", 1000)),
+        explain_sample=float(os.getenv("API_SLOW_QUERY_EXPLAIN_SAMPLE", 0)),
+    )
+
 def run_select_query(query, params=None):
-    conn = None
-    cursor = None
+    with get_db_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            db_start = time.perf_counter()
+            if params is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query, params)
+
+            column_names = [desc[0] for desc in cursor.description]
+            data = cursor.fetchall()
+            db_end = time.perf_counter()
+            if slow_query_log is not None:
+                slow_query_log.record(cursor, query, params, db_end - db_start, len(data), metrics.current_route())
+        rows_start = time.perf_counter()
+        results = [dict(zip(column_names, row)) for row in data]
+        metrics.observe_query(db_end - db_start, time.perf_counter() - rows_start, len(results))
+        return results
+
+stream_fetch_size = int(os.getenv("API_STREAM_FETCH_SIZE", 2000))
+stream_formats = ('json', 'ndjson', 'json-stream')
+
+def stream_select_rows(query, params=None, fetch_size=None):
+    # Named (server-side) cursor: rows come over in fetch_size batches instead of one fetchall().
+    # Yields (cursor.description, rows); the first batch is yielded even when it is empty.
+    # The route is read now: the generator runs after the request context has been popped.
+    return _stream_select_rows(query, params, fetch_size or stream_fetch_size, metrics.current_route())
+
+def _stream_select_rows(query, params, fetch_size, route):
+    with get_db_pool().connection() as conn:
+        with conn.cursor(name=f"vapi_stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = fetch_size
+            if params is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query, params)
+
+            # Only time spent waiting on Postgres is counted; time the client takes to read is not.
+            db_start = time.perf_counter()
+            rows = cursor.fetchmany(fetch_size)
+            db_seconds = time.perf_counter() - db_start
+            total_rows = len(rows)
+            yield cursor.description, rows
+            while rows:
+                db_start = time.perf_counter()
+                rows = cursor.fetchmany(fetch_size)
+                db_seconds += time.perf_counter() - db_start
+                total_rows += len(rows)
+                if rows:
+                    yield cursor.description, rows
+            metrics.observe_query(db_seconds, None, total_rows, route)
+
+def stream_select_query(query, params=None, fetch_size=None):
+    for description, rows in stream_select_rows(query, params, fetch_size):
+        if rows:
+            column_names = [desc[0] for desc in description]
+            yield [dict(zip(column_names, row)) for row in rows]
+
+def streamed_response(batches, fmt):
+    def dumps(row):
+        return app.json.dumps(row, separators=(',', ':'))
+
+    def generate_ndjson():
+        for batch in batches:
+            yield ''.join(dumps(row) + '\n' for row in batch)
+
+    def generate_json_array():
+        yield '['
+        first = True
+        for batch in batches:
+            chunk = ','.join(dumps(row) for row in batch)
+            if chunk:
+                yield chunk if first else ',' + chunk
+                first = False
+        yield ']\n'
+
+    if fmt == 'ndjson':
+        return Response(generate_ndjson(), mimetype='application/x-ndjson')
+    return Response(generate_json_array(), mimetype='application/json')
+
+# Post-load snapshot written by import-matches.py; SNAPSHOT_DIR/current always points at the latest load.
+snapshot_dir = os.getenv("SNAPSHOT_DIR")
+
+# Rows per server-side fetch for /export/ endpoints; each fetch becomes one Parquet row group / Arrow record batch.
+export_batch_size = int(os.getenv("API_EXPORT_BATCH_SIZE", 50000))
+
+def export_response(name, query, params, start, end):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.export_formats:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+    mimetype, extension, needs_pyarrow = export.export_formats[fmt]
+    if needs_pyarrow and export.pa is None:
+        return jsonify({"error": f"{fmt} export is not available on this server."}), 501
+
+    batches = stream_select_rows(query, params, fetch_size=export_batch_size)
+    response = Response(export.generate(batches, fmt), mimetype=mimetype)
+    filename = f"{name}_{start:%Y-%m-%d}_{end:%Y-%m-%d}.{extension}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def select_response(query, params=None):
+    # Unbounded endpoints: ?format=ndjson or ?format=json-stream stream rows from a server-side cursor.
+    fmt = request.args.get('format', 'json')
+    if fmt not in stream_formats:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+    if fmt == 'json':
+        return jsonify(run_select_query(query, params))
+    return streamed_response(stream_select_query(query, params), fmt)
+
+# Selectable columns per endpoint family: name -> (select expression, table alias it needs).
+# ?fields= picks a subset; joins whose alias no selected column needs are left out.
+# Match endpoints read MATCH_RESULTS, the denormalized copy of MATCHES maintained by match_insert, so they need no joins.
+match_fields = {
+    "MATCH_ID": ('a."MATCH_ID"', 'a'),
+    "P1": ('a."P1"', 'a'),
+    "P1_ARCH": ('a."P1_ARCH"', 'a'),
+    "P1_SUBARCH": ('a."P1_SUBARCH"', 'a'),
+    "P1_WINS": ('a."P1_WINS"', 'a'),
+    "P2": ('a."P2"', 'a'),
+    "P2_ARCH": ('a."P2_ARCH"', 'a'),
+    "P2_SUBARCH": ('a."P2_SUBARCH"', 'a'),
+    "P2_WINS": ('a."P2_WINS"', 'a'),
+    "MATCH_WINNER": ('a."MATCH_WINNER"', 'a'),
+    "EVENT_DATE": ('a."EVENT_DATE"', 'a'),
+}
+
+event_fields = {
+    "EVENT_ID": ('e."EVENT_ID"', 'e'),
+    "EVENT_DATE": ('e."EVENT_DATE"', 'e'),
+    "FORMAT": ('c."FORMAT"', 'c'),
+    "EVENT_TYPE": ('c."EVENT_TYPE"', 'c'),
+    "TOTAL_PLAYERS": ('e."TOTAL_PLAYERS"', 'e'),
+}
+event_joins = {
+    'c': '''JOIN "[vapi].VALID_EVENT_TYPES" c 
+    ON e."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"''',
+}
+
+# /events/player/ aggregates MATCH_RESULTS per event; only the plain columns go into GROUP BY.
+player_event_fields = {
+    "EVENT_ID": ('a."EVENT_ID"', 'a'),
+    "EVENT_DATE": ('a."EVENT_DATE"', 'a'),
+    "FORMAT": ('c."FORMAT"', 'c'),
+    "EVENT_TYPE": ('c."EVENT_TYPE"', 'c'),
+    "ARCHETYPE": ('MAX(a."P1_ARCH") AS "ARCHETYPE"', 'a'),
+    "SUBARCHETYPE": ('MAX(a."P1_SUBARCH") AS "SUBARCHETYPE"', 'a'),
+    "WINS": ('''COUNT(CASE WHEN a."MATCH_WINNER" = 'P1' THEN 1 END) AS "WINS"''', 'a'),
+    "LOSSES": ('''COUNT(CASE WHEN a."MATCH_WINNER" = 'P2' THEN 1 END) AS "LOSSES"''', 'a'),
+}
+player_event_group_fields = ("EVENT_ID", "EVENT_DATE", "FORMAT", "EVENT_TYPE")
+player_event_joins = {
+    'c': '''JOIN "[vapi].VALID_EVENT_TYPES" c
+    ON a."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"''',
+}
+
+def get_fields(available, key_field):
+    # ?fields=MATCH_ID,P1,P2 (any case); the key column is always returned. Columns keep their default order.
+    value = request.args.get('fields')
+    if value is None:
+        return list(available)
+    requested = {name.strip().upper() for name in value.split(',') if name.strip()}
+    if not requested or not requested <= available.keys():
+        raise ValueError(f"Invalid fields: {value}")
+    requested.add(key_field)
+    return [name for name in available if name in requested]
+
+def build_select(fields, available, from_clause, joins, where):
+    columns = []
+    aliases = set()
+    for name in fields:
+        expression, alias = available[name]
+        if expression not in columns:
+            columns.append(expression)
+        aliases.add(alias)
+    join_sql = ''.join(f'\n    {join}' for alias, join in joins.items() if alias in aliases)
+    return f'''
+    SELECT {", ".join(columns)}
+    FROM {from_clause}{join_sql}
+    ''' + where
+
+match_winners = ('P1', 'P2', 'NA')
+
+# Player names from the URL resolve to PLAYERS.PLAYER_ID (trimmed, case-insensitive), so player lookups compare BIGINTs.
+player_id_sql = '(SELECT "PLAYER_ID" FROM "[vapi].PLAYERS" WHERE "PLAYER_KEY" = upper(trim(%s)))'
+
+# Bulk lookups: ?ids=1,2,3 or POST {"ids": [1, 2, 3]}, resolved with one = ANY(%s) query.
+bulk_max_ids = int(os.getenv("API_BULK_MAX_IDS", 1000))
+
+def get_bulk_ids():
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        ids = body.get('ids') if isinstance(body, dict) else None
+        if not isinstance(ids, list):
+            raise ValueError("POST body must be {\"ids\": [...]}.")
+    else:
+        ids = [value for value in request.args.get('ids', '').split(',') if value.strip()]
+    if any(isinstance(value, bool) or not isinstance(value, (int, str)) for value in ids):
+        raise ValueError("ids must be integers.")
+    ids = list(dict.fromkeys(int(value) for value in ids))
+    if not ids or len(ids) > bulk_max_ids:
+        raise ValueError(f"Between 1 and {bulk_max_ids} ids are required.")
+    return ids
+
+def get_match_filters():
+    # Optional filters shared by the match list endpoints. Returns (sql, params) to append to the WHERE clause.
+    sql = ''
+    params = ()
+    for side in ('P1', 'P2'):
+        deck_id = request.args.get(f'{side.lower()}_deck_id')
+        archetype = request.args.get(f'{side.lower()}_arch')
+        subarchetype = request.args.get(f'{side.lower()}_subarch')
+        if deck_id is not None:
+            if archetype is not None or subarchetype is not None:
+                raise ValueError(f"Use either {side.lower()}_deck_id or an archetype filter, not both.")
+            sql += f' AND a."{side}_DECK_ID" = %s'
+            params += (int(deck_id),)
+        elif archetype is not None or subarchetype is not None:
+            # Archetype names resolve to DECK_IDs from the classification cache, so MATCHES is filtered by index.
+            deck_ids = [
+                row["DECK_ID"] for row in classifications.decks()
+                if (archetype is None or (row["ARCHETYPE"] or '').upper() == archetype.upper())
+                and (subarchetype is None or (row["SUBARCHETYPE"] or '').upper() == subarchetype.upper())
+            ]
+            sql += f' AND a."{side}_DECK_ID" = ANY(%s)'
+            params += (deck_ids,)
+
+    event_type_id = request.args.get('event_type_id')
+    if event_type_id is not None:
+        sql += ' AND a."EVENT_TYPE_ID" = %s'
+        params += (int(event_type_id),)
+
+    winner = request.args.get('winner')
+    if winner is not None:
+        if winner.upper() not in match_winners:
+            raise ValueError(f"Invalid winner: {winner}")
+        sql += ' AND a."MATCH_WINNER" = %s'
+        params += (winner.upper(),)
+
+    opponent = request.args.get('opponent')
+    if opponent is not None:
+        sql += f' AND a."P2_ID" = {player_id_sql}'
+        params += (opponent,)
+    return sql, params
+
+def run_match_query(where, params, fields=None):
+    fields = fields or list(match_fields)
+    return run_select_query(build_select(fields, match_fields, '"[vapi].MATCH_RESULTS" a', {}, where), params)
+
+def encode_cursor(kind, last_id):
+    token = base64.urlsafe_b64encode(f"{kind}:{last_id}".encode()).decode()
+    return token.rstrip('=')
+
+def decode_cursor(kind, token):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        if params is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, params)
-
-        column_names = [desc[0] for desc in cursor.description]
-        data = cursor.fetchall()
-        return [dict(zip(column_names, row)) for row in data]
-    finally:
-        if cursor is not None:
-            cursor.close()
-        if conn is not None:
-            conn.close()
-
-# @app.before_request
-# def log_request():
-#     if request.endpoint:
-#         start_time = datetime.utcnow()
-
-#         conn = get_db_connection()
-#         cursor = conn.cursor()
-        
-#         insert_api_logging_query = '''
-#         INSERT INTO "[vapi].API_LOGGING_STATS" ("ENDPOINT", "METHOD", "STATUS_CODE", "CLIENT_IP", "USER_AGENT", "REQUEST_START")
-#         VALUES (%s, %s, %s, %s, %s, %s) 
-#         RETURNING "ID";
-#         '''
-
-#         cursor.execute(insert_api_logging_query, (request.path, request.method, 200, request.remote_addr, request.headers.get('User-Agent'), start_time))
-        
-#         log_id = cursor.fetchone()[0]
-#         conn.commit()
-        
-#         cursor.close()
-#         conn.close()
-        
-#         g.log_id = log_id
-#         g.start_time = start_time
-
-# @app.after_request
-# def update_status_code(response):
-#     if hasattr(g, 'log_id'):
-#         end_time = datetime.utcnow()
-#         duration = (end_time - g.start_time).total_seconds() * 1000
-
-#         conn = get_db_connection()
-#         cursor = conn.cursor()
-
-#         query_params = json.dumps(request.args.to_dict())
-
-#         update_api_logging_query = '''
-#         UPDATE "[vapi].API_LOGGING_STATS"
-#         SET "QUERY_PARAMS" = %s, "STATUS_CODE" = %s, "REQUEST_END" = %s, "RESPONSE_TIME_MS" = %s
-#         WHERE "ID" = %s;
-#         '''
-
-#         cursor.execute(update_api_logging_query, (query_params, response.status_code, end_time, duration, g.log_id))
-        
-#         conn.commit()
-#         cursor.close()
-#         conn.close()
-#     return response
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {token}")
+    cursor_kind, _, last_id = raw.partition(':')
+    if cursor_kind != kind:
+        raise ValueError(f"Cursor does not belong to this endpoint: {token}")
+    return int(last_id)
+
+def get_page_position(kind, after_param):
+    # Keyset continuation (cursor/after_*) takes the place of page; page stays as the OFFSET fallback.
+    cursor = request.args.get('cursor')
+    after_id = request.args.get(after_param)
+    page = int(request.args.get('page', 1))
+
+    if page < 1:
+        raise ValueError(f"Invalid page: {page}")
+    if cursor is not None and after_id is not None:
+        raise ValueError(f"Use either cursor or {after_param}, not both.")
+    if (cursor is not None or after_id is not None) and 'page' in request.args:
+        raise ValueError("page cannot be combined with a cursor.")
+
+    if cursor is not None:
+        return decode_cursor(kind, cursor), 0
+    if after_id is not None:
+        return int(after_id), 0
+    return None, (page - 1) * page_size
+
+def next_cursor_query(next_cursor):
+    args = request.args.to_dict()
+    for key in ('page', 'cursor', 'after_match_id', 'after_event_id'):
+        args.pop(key, None)
+    args['cursor'] = next_cursor
+    return urlencode(args)
+
+def paged_response(results, kind, id_column):
+    response = jsonify(results)
+    # A full page means there may be more rows; hand back a continuation token.
+    if len(results) == page_size:
+        next_cursor = encode_cursor(kind, results[-1][id_column])
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{next_cursor_query(next_cursor)}>; rel="next"'
+    return response
+
+# Latest ETL load, re-checked at most every API_LOAD_CHECK_SECONDS per worker.
+load_check_seconds = float(os.getenv("API_LOAD_CHECK_SECONDS", 60))
+latest_load = {"checked_at": None, "row": None}
+
+def get_latest_load():
+    now = time.monotonic()
+    if latest_load["checked_at"] is None or now - latest_load["checked_at"] >= load_check_seconds:
+        query = '''
+        SELECT "LOAD_RPT_ID", "PROC_DT"
+            FROM "[vapi].LOAD_REPORTS"
+            ORDER BY "LOAD_RPT_ID" DESC
+            LIMIT 1
+        '''
+        results = run_select_query(query)
+        latest_load["row"] = results[0] if results else {"LOAD_RPT_ID": None, "PROC_DT": None}
+        latest_load["checked_at"] = now
+    return latest_load["row"]
+
+classifications = ClassificationCache(run_select_query, check_seconds=float(os.getenv("API_CLASS_CHECK_SECONDS", 60)))
+
+def get_data_version():
+    # Responses change when a load lands or when parse-classes.py adds classifications.
+    return f"{get_latest_load()['LOAD_RPT_ID']}|{classifications.version()}"
+
+def build_response_cache():
+    backend_name = os.getenv("API_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("API_CACHE_MAX_ENTRIES", 1024))
+    max_bytes = int(float(os.getenv("API_CACHE_MAX_MB", 64)) * 1024 * 1024)
+    if backend_name == "off":
+        return None
+    if backend_name == "sqlite":
+        path = os.getenv("API_CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "vapi_response_cache.sqlite3"))
+        backend = rc.SQLiteBackend(path, max_entries=max_entries, max_bytes=max_bytes)
+    elif backend_name == "memory":
+        backend = rc.MemoryBackend(max_entries=max_entries, max_bytes=max_bytes)
+    else:
+        raise RuntimeError(f"Unknown API_CACHE_BACKEND: {backend_name}")
+    return rc.ResponseCache(backend, get_data_version)
+
+response_cache = build_response_cache()
+
+def cached_response(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # POST bodies are not part of the key, so only GET responses are cached.
+        if response_cache is None or request.method != 'GET':
+            return view(*args, **kwargs)
+
+        key = response_cache.make_key(request.path, request.args)
+        entry = response_cache.get(key)
+        if entry is not None:
+            status, headers, body = entry
+            return Response(body, status=status, headers=headers)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            headers = [(k, v) for k, v in response.headers.items() if k != 'Content-Length']
+            response_cache.set(key, response.status_code, headers, response.get_data())
+        return response
+    return load_versioned(wrapper)
+
+def load_versioned(view):
+    # Responses from these views only change with the data version (see check_conditional_get).
+    view.load_versioned = True
+    return view
+
+def get_load_validators():
+    load = get_latest_load()
+    validator = f"{get_data_version()}|{load['PROC_DT']}|{request.path}?{rc.normalize_args(request.args)}"
+    etag = hashlib.sha1(validator.encode()).hexdigest()
+    dates = [value for value in (load['PROC_DT'], classifications.last_modified()) if value is not None]
+    last_modified = max(dates).replace(microsecond=0, tzinfo=timezone.utc) if dates else None
+    return etag, last_modified
+
+# Request logging into API_LOGGING_STATS: rows are queued in memory and inserted in batches by a background thread.
+request_log = None
+if os.getenv("API_REQUEST_LOG", "1") == "1":
+    request_log = RequestLogWriter(
+        get_db_connection,
+        max_queue=int(os.getenv("API_REQUEST_LOG_QUEUE", 10000)),
+        batch_size=int(os.getenv("API_REQUEST_LOG_BATCH", 500)),
+        flush_seconds=float(os.getenv("API_REQUEST_LOG_FLUSH_SECONDS", 2)),
+    )
+
+@app.before_request
+def start_request_log():
+    g.request_start = datetime.now(timezone.utc).replace(tzinfo=None)
+    g.request_start_perf = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    if request_log is not None and request.endpoint:
+        end_time = datetime.now(timezone.utc).replace(tzinfo=None)
+        start_time = g.get('request_start', end_time)
+        duration = (time.perf_counter() - g.request_start_perf) * 1000 if 'request_start_perf' in g else 0.0
+        request_log.log((
+            request.path[:100],
+            request.method,
+            json.dumps(request.args.to_dict()),
+            response.status_code,
+            request.remote_addr,
+            request.headers.get('User-Agent'),
+            start_time,
+            end_time,
+            duration,
+        ))
+    return response
+
+@app.before_request
+def start_request_metrics():
+    if metrics.enabled:
+        metrics.IN_FLIGHT.inc()
+        g.metrics_in_flight = True
+
+@app.after_request
+def record_request_metrics(response):
+    seconds = time.perf_counter() - g.request_start_perf if 'request_start_perf' in g else None
+    metrics.observe_request(metrics.current_route(), request.method, response.status_code, seconds)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if g.pop('metrics_in_flight', False):
+        metrics.IN_FLIGHT.dec()
+
+@app.before_request
+def check_conditional_get():
+    view = app.view_functions.get(request.endpoint)
+    if request.method not in ('GET', 'HEAD') or not getattr(view, 'load_versioned', False):
+        return None
+
+    g.etag, g.last_modified = get_load_validators()
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(g.etag)
+    else:
+        not_modified = (
+            request.if_modified_since is not None
+            and g.last_modified is not None
+            and g.last_modified <= request.if_modified_since
+        )
+    if not_modified:
+        # Answered from the load watermark alone; the route's SQL never runs.
+        return Response(status=304)
+    return None
+
+@app.after_request
+def set_load_validators(response):
+    if hasattr(g, 'etag') and response.status_code in (200, 304):
+        response.set_etag(g.etag, weak=True)
+        if g.last_modified is not None:
+            response.last_modified = g.last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.after_request
+def compress_response(response):
+    if compress_min_bytes <= 0:
+        return response
+    return compression.compress_response(
+        response,
+        request.accept_encodings,
+        min_size=compress_min_bytes,
+        gzip_level=gzip_level,
+        brotli_quality=brotli_quality,
+    )
+
+@app.errorhandler(db_pool.PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"error": "Database busy. Please retry."}), 503
 
 @app.route('/')
 def home():   
     return redirect('https://mox-data.com/vintage-data', code=301)
 
+# Operational counters and /metrics are only served to requests carrying API_STATS_TOKEN; without a token they are off.
+# The request's address is not checked: behind Nginx every request comes from the proxy.
+stats_token = os.getenv("API_STATS_TOKEN")
+
+def stats_protected(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        if not stats_token or not hmac.compare_digest(auth.encode(), f"Bearer {stats_token}".encode()):
+            return jsonify({"error": "Not found."}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/pool-stats/', methods=['GET'])
+@stats_protected
+def get_pool_stats():
+    return jsonify(get_db_pool().stats())
+
+@app.route('/cache-stats/', methods=['GET'])
+@stats_protected
+def get_cache_stats():
+    if response_cache is None:
+        return jsonify({"backend": "off"})
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+@stats_protected
+def get_metrics():
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are not available on this server."}), 501
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/request-log-stats/', methods=['GET'])
+@stats_protected
+def get_request_log_stats():
+    if request_log is None:
+        return jsonify({"enabled": False})
+    return jsonify(request_log.stats())
+
 @app.route('/matches/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_matches():
     start = request.args.get('start', '2024-08-25')
     end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
-    page = request.args.get('page', 1)
 
     try:
         start = datetime.strptime(start, '%Y-%m-%d')
         end = datetime.strptime(end, '%Y-%m-%d')
-        page = int(page)
+        after_id, offset = get_page_position('m', 'after_match_id')
+        fields = get_fields(match_fields, 'MATCH_ID')
+        filters, filter_params = get_match_filters()
     except ValueError:
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    if page < 1:
-        return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    offset = (page - 1) * page_size
 
     query = '''
-    SELECT a."MATCH_ID", a."P1", b."ARCHETYPE" AS "P1_ARCH", b."SUBARCHETYPE" AS "P1_SUBARCH", a."P1_WINS", 
-    a."P2", c."ARCHETYPE" AS "P2_ARCH", c."SUBARCHETYPE" AS "P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER", d."EVENT_DATE"
-    FROM "[vapi].MATCHES" a 
-    JOIN "[vapi].VALID_DECKS" b 
-    ON a."P1_DECK_ID" = b."DECK_ID"
-    JOIN "[vapi].VALID_DECKS" c
-    ON a."P2_DECK_ID" = c."DECK_ID"
-    JOIN "[vapi].EVENTS" d  
-    ON a."EVENT_ID" = d."EVENT_ID"
-    WHERE d."EVENT_DATE" >= %s AND d."EVENT_DATE" <= %s
-    ORDER BY "MATCH_ID" DESC
-    LIMIT %s OFFSET %s
-    '''
+    WHERE a."EVENT_DATE" >= %s AND a."EVENT_DATE" <= %s
+    ''' + filters
+    params = (start, end) + filter_params
 
-    results = run_select_query(query, (start, end, page_size, offset))
-    return jsonify(results)
+    if after_id is not None:
+        query += ' AND a."MATCH_ID" < %s'
+        params += (after_id,)
+    query += ' ORDER BY a."MATCH_ID" DESC LIMIT %s OFFSET %s'
+
+    results = run_match_query(query, params + (page_size, offset), fields)
+    return paged_response(results, 'm', 'MATCH_ID')
 
 @app.route('/matches/<int:match_id>/', methods=['GET'])
+@cached_response
 def get_match_id(match_id):
+    try:
+        fields = get_fields(match_fields, 'MATCH_ID')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
     query = '''
-    SELECT a."MATCH_ID", a."P1", b."ARCHETYPE" AS "P1_ARCH", b."SUBARCHETYPE" AS "P1_SUBARCH", a."P1_WINS", 
-    a."P2", c."ARCHETYPE" AS "P2_ARCH", c."SUBARCHETYPE" AS "P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER", d."EVENT_DATE"
-    FROM "[vapi].MATCHES" a 
-    JOIN "[vapi].VALID_DECKS" b 
-    ON a."P1_DECK_ID" = b."DECK_ID"
-    JOIN "[vapi].VALID_DECKS" c
-    ON a."P2_DECK_ID" = c."DECK_ID"
-    JOIN "[vapi].EVENTS" d  
-    ON a."EVENT_ID" = d."EVENT_ID"
     WHERE a."MATCH_ID" = %s
-    ORDER BY "MATCH_ID" DESC
+    ORDER BY a."MATCH_ID" DESC
     '''
 
-    results = run_select_query(query, (match_id,))
+    results = run_match_query(query, (match_id,), fields)
     return jsonify(results)
 
+@app.route('/matches/bulk/', methods=['GET', 'POST'], strict_slashes=False)
+@cached_response
+def get_matches_bulk():
+    try:
+        ids = get_bulk_ids()
+        fields = get_fields(match_fields, 'MATCH_ID')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    query = '''
+    WHERE a."MATCH_ID" = ANY(%s)
+    ORDER BY a."MATCH_ID" DESC
+    '''
+
+    results = run_match_query(query, (ids,), fields)
+    return jsonify({str(row["MATCH_ID"]): row for row in results})
+
 @app.route('/matches/player/<string:P1>/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_matches_by_pid(P1):
     start = request.args.get('start', '2024-08-25')
     end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
-    page = request.args.get('page', 1)
 
     try:
         start = datetime.strptime(start, '%Y-%m-%d')
         end = datetime.strptime(end, '%Y-%m-%d')
-        page = int(page)
+        after_id, offset = get_page_position('m', 'after_match_id')
+        fields = get_fields(match_fields, 'MATCH_ID')
+        filters, filter_params = get_match_filters()
     except ValueError:
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    if page < 1:
-        return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    offset = (page - 1) * page_size
 
-    query = '''
-    SELECT a."MATCH_ID", a."P1", b."ARCHETYPE" AS "P1_ARCH", b."SUBARCHETYPE" AS "P1_SUBARCH", a."P1_WINS", 
-    a."P2", c."ARCHETYPE" AS "P2_ARCH", c."SUBARCHETYPE" AS "P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER", d."EVENT_DATE"
-    FROM "[vapi].MATCHES" a 
-    JOIN "[vapi].VALID_DECKS" b 
-    ON a."P1_DECK_ID" = b."DECK_ID"
-    JOIN "[vapi].VALID_DECKS" c
-    ON a."P2_DECK_ID" = c."DECK_ID"
-    JOIN "[vapi].EVENTS" d  
-    ON a."EVENT_ID" = d."EVENT_ID"
-    WHERE a."P1" = %s AND d."EVENT_DATE" >= %s AND d."EVENT_DATE" <= %s
-    ORDER BY "MATCH_ID" DESC
-    LIMIT %s OFFSET %s
-    '''
+    query = f'''
+    WHERE a."P1_ID" = {player_id_sql} AND a."EVENT_DATE" >= %s AND a."EVENT_DATE" <= %s
+    ''' + filters
+    params = (P1, start, end) + filter_params
 
-    results = run_select_query(query, (P1, start, end, page_size, offset))
-    return jsonify(results)
+    if after_id is not None:
+        query += ' AND a."MATCH_ID" < %s'
+        params += (after_id,)
+    query += ' ORDER BY a."MATCH_ID" DESC LIMIT %s OFFSET %s'
+
+    results = run_match_query(query, params + (page_size, offset), fields)
+    return paged_response(results, 'm', 'MATCH_ID')
 
 @app.route('/matches/event/<int:event_id>/', methods=['GET'])
+@cached_response
 def get_matches_by_eid(event_id):
+    try:
+        fields = get_fields(match_fields, 'MATCH_ID')
+        filters, filter_params = get_match_filters()
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
     query = '''
-    SELECT a."MATCH_ID", a."P1", b."ARCHETYPE" AS "P1_ARCH", b."SUBARCHETYPE" AS "P1_SUBARCH", a."P1_WINS", 
-    a."P2", c."ARCHETYPE" AS "P2_ARCH", c."SUBARCHETYPE" AS "P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER", d."EVENT_DATE"
-    FROM "[vapi].MATCHES" a 
-    JOIN "[vapi].VALID_DECKS" b 
-    ON a."P1_DECK_ID" = b."DECK_ID"
-    JOIN "[vapi].VALID_DECKS" c
-    ON a."P2_DECK_ID" = c."DECK_ID"
-    JOIN "[vapi].EVENTS" d  
-    ON a."EVENT_ID" = d."EVENT_ID"
     WHERE a."EVENT_ID" = %s
-    '''
+    ''' + filters
 
-    results = run_select_query(query, (event_id,))
+    results = run_match_query(query, (event_id,) + filter_params, fields)
     return jsonify(results)
 
 @app.route('/events/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_events():
     start = request.args.get('start', '2024-08-25')
     end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
-    page = request.args.get('page', 1)
 
     try:
         start = datetime.strptime(start, '%Y-%m-%d')
         end = datetime.strptime(end, '%Y-%m-%d')
-        page = int(page)
+        after_id, offset = get_page_position('e', 'after_event_id')
+        fields = get_fields(event_fields, 'EVENT_ID')
     except ValueError:
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    if page < 1:
+
+    query = build_select(fields, event_fields, '"[vapi].EVENTS" e', event_joins, '''
+    WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" <= %s AND e."TOTAL_PLAYERS" > 0
+    ''')
+    params = (start, end)
+
+    if after_id is not None:
+        query += ' AND e."EVENT_ID" < %s'
+        params += (after_id,)
+    query += ' ORDER BY e."EVENT_ID" DESC LIMIT %s OFFSET %s'
+
+    results = run_select_query(query, params + (page_size, offset))
+    return paged_response(results, 'e', 'EVENT_ID')
+
+@app.route('/events/bulk/', methods=['GET', 'POST'], strict_slashes=False)
+@cached_response
+def get_events_bulk():
+    try:
+        ids = get_bulk_ids()
+        fields = get_fields(event_fields, 'EVENT_ID')
+    except ValueError:
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    offset = (page - 1) * page_size
 
-    query = '''
-    SELECT x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE", count(distinct("P1")) AS "TOTAL_PLAYERS"
-    FROM (
-        SELECT a."P1", b."EVENT_ID", b."EVENT_DATE", c."FORMAT", c."EVENT_TYPE"
-            FROM "[vapi].MATCHES" a 
-            JOIN "[vapi].EVENTS" b 
-            ON a."EVENT_ID" = b."EVENT_ID"
-            JOIN "[vapi].VALID_EVENT_TYPES" c 
-            ON b."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
-    ) x 
-    WHERE x."EVENT_DATE" >= %s AND x."EVENT_DATE" <= %s
-    GROUP BY x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE"
-    ORDER BY x."EVENT_ID" DESC
-    LIMIT %s OFFSET %s
-    '''
+    query = build_select(fields, event_fields, '"[vapi].EVENTS" e', event_joins, '''
+    WHERE e."EVENT_ID" = ANY(%s) AND e."TOTAL_PLAYERS" > 0
+    ORDER BY e."EVENT_ID" DESC
+    ''')
 
-    results = run_select_query(query, (start, end, page_size, offset))
-    return jsonify(results)
+    results = run_select_query(query, (ids,))
+    return jsonify({str(row["EVENT_ID"]): row for row in results})
 
 @app.route('/events/<int:event_id>/', methods=['GET'])
+@cached_response
 def get_event_id(event_id):
-    query = '''
-    SELECT x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE", count(distinct("P1")) AS "TOTAL_PLAYERS"
-    FROM (
-        SELECT a."P1", b."EVENT_ID", b."EVENT_DATE", c."FORMAT", c."EVENT_TYPE"
-            FROM "[vapi].MATCHES" a 
-            JOIN "[vapi].EVENTS" b 
-            ON a."EVENT_ID" = b."EVENT_ID"
-            JOIN "[vapi].VALID_EVENT_TYPES" c 
-            ON b."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
-            WHERE b."EVENT_ID" = %s
-    ) x 
-    GROUP BY x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE"
-    '''
+    try:
+        fields = get_fields(event_fields, 'EVENT_ID')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    query = build_select(fields, event_fields, '"[vapi].EVENTS" e', event_joins, '''
+    WHERE e."EVENT_ID" = %s AND e."TOTAL_PLAYERS" > 0
+    ''')
 
     results = run_select_query(query, (event_id,))
     return jsonify(results)
 
+def http_date_sql(column):
+    # Same text Flask's JSON provider produces for dates, e.g. "Sun, 25 Aug 2024 00:00:00 GMT".
+    return f'''to_char({column}, 'Dy, DD Mon YYYY "00:00:00 GMT"')'''
+
+@app.route('/events/<int:event_id>/full/', methods=['GET'], strict_slashes=False)
+@cached_response
+def get_event_full(event_id):
+    # Event, standings and matches built as one JSON document in Postgres; the text is returned as-is.
+    query = f'''
+    SELECT json_build_object(
+        'event', json_build_object(
+            'EVENT_ID', e."EVENT_ID", 'EVENT_DATE', {http_date_sql('e."EVENT_DATE"')}, 'FORMAT', ves."FORMAT",
+            'EVENT_TYPE', ves."EVENT_TYPE", 'TOTAL_PLAYERS', e."TOTAL_PLAYERS"
+        ),
+        'standings', COALESCE((
+            SELECT json_agg(json_build_object(
+                'EVENT_DATE', {http_date_sql('e."EVENT_DATE"')}, 'EVENT_TYPE', ves."EVENT_TYPE", 'EVENT_RANK', es."EVENT_RANK",
+                'P1', es."P1", 'WINS', a."WINS", 'LOSSES', a."LOSSES", 'BYES', es."BYES"
+            ) ORDER BY es."EVENT_RANK" ASC)
+            FROM "[vapi].EVENT_STANDINGS" es
+            JOIN "[vapi].PLAYER_EVENT_RECORDS" a
+            ON es."EVENT_ID" = a."EVENT_ID" AND es."P1_ID" = a."P1_ID"
+            WHERE es."EVENT_ID" = e."EVENT_ID"
+        ), '[]'::json),
+        'matches', COALESCE((
+            SELECT json_agg(json_build_object(
+                'MATCH_ID', m."MATCH_ID", 'P1', m."P1", 'P1_ARCH', m."P1_ARCH", 'P1_SUBARCH', m."P1_SUBARCH", 'P1_WINS', m."P1_WINS",
+                'P2', m."P2", 'P2_ARCH', m."P2_ARCH", 'P2_SUBARCH', m."P2_SUBARCH", 'P2_WINS', m."P2_WINS",
+                'MATCH_WINNER', m."MATCH_WINNER", 'EVENT_DATE', {http_date_sql('m."EVENT_DATE"')}
+            ) ORDER BY m."MATCH_ID" DESC)
+            FROM "[vapi].MATCH_RESULTS" m
+            WHERE m."EVENT_ID" = e."EVENT_ID"
+        ), '[]'::json)
+    )::text AS "EVENT_FULL"
+    FROM "[vapi].EVENTS" e
+    JOIN "[vapi].VALID_EVENT_TYPES" ves
+    ON ves."EVENT_TYPE_ID" = e."EVENT_TYPE_ID"
+    WHERE e."EVENT_ID" = %s AND e."TOTAL_PLAYERS" > 0
+    '''
+
+    results = run_select_query(query, (event_id,))
+    if not results:
+        return jsonify({"error": "Event not found."}), 404
+    return Response(results[0]["EVENT_FULL"] + '\n', mimetype='application/json')
+
 @app.route('/events/<int:event_id>/standings/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_event_ranks(event_id):
     rank = request.args.get('rank', 0)
 
@@ -289,15 +821,8 @@ def get_event_ranks(event_id):
     ON es."EVENT_ID" = e."EVENT_ID"
     JOIN "[vapi].VALID_EVENT_TYPES" ves 
     ON ves."EVENT_TYPE_ID" = e."EVENT_TYPE_ID"
-    JOIN 
-    (
-        SELECT "EVENT_ID", "P1", 
-            SUM(CASE WHEN "MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END) AS "WINS", 
-            SUM(CASE WHEN "MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END) AS "LOSSES"
-        FROM "[vapi].MATCHES"
-        GROUP BY "EVENT_ID", "P1"
-    ) a
-    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1" = a."P1"
+    JOIN "[vapi].PLAYER_EVENT_RECORDS" a
+    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1_ID" = a."P1_ID"
     WHERE es."EVENT_ID" = %s
     '''
 
@@ -312,24 +837,18 @@ def get_event_ranks(event_id):
     return jsonify(results)
 
 @app.route('/events/<int:event_id>/player/<string:P1>/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_event_ranks_pid(event_id, P1):
-    query = '''
+    query = f'''
     SELECT e."EVENT_DATE", ves."EVENT_TYPE", es."EVENT_RANK", es."P1", a."WINS", a."LOSSES", es."BYES"
     FROM "[vapi].EVENTS" e 
     JOIN "[vapi].EVENT_STANDINGS" es 
     ON es."EVENT_ID" = e."EVENT_ID"
     JOIN "[vapi].VALID_EVENT_TYPES" ves 
     ON ves."EVENT_TYPE_ID" = e."EVENT_TYPE_ID"
-    JOIN 
-    (
-        SELECT "EVENT_ID", "P1", 
-            SUM(CASE WHEN "MATCH_WINNER" = 'P1' THEN 1 ELSE 0 END) AS "WINS", 
-            SUM(CASE WHEN "MATCH_WINNER" = 'P2' THEN 1 ELSE 0 END) AS "LOSSES"
-        FROM "[vapi].MATCHES"
-        GROUP BY "EVENT_ID", "P1"
-    ) a
-    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1" = a."P1"
-    WHERE es."EVENT_ID" = %s AND es."P1" = %s
+    JOIN "[vapi].PLAYER_EVENT_RECORDS" a
+    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1_ID" = a."P1_ID"
+    WHERE es."EVENT_ID" = %s AND es."P1_ID" = {player_id_sql}
     ORDER BY es."EVENT_RANK" ASC
     '''
 
@@ -337,90 +856,407 @@ def get_event_ranks_pid(event_id, P1):
     return jsonify(results)
 
 @app.route('/events/player/<string:P1>/', methods=['GET'], strict_slashes=False)
+@cached_response
 def get_events_by_pid(P1):
     start = request.args.get('start', '2024-08-25')
     end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d')
+        end = datetime.strptime(end, '%Y-%m-%d')
+        after_id, offset = get_page_position('e', 'after_event_id')
+        fields = get_fields(player_event_fields, 'EVENT_ID')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    query = build_select(fields, player_event_fields, '"[vapi].MATCH_RESULTS" a', player_event_joins, f'''
+    WHERE a."P1_ID" = {player_id_sql} AND a."EVENT_DATE" >= %s AND a."EVENT_DATE" <= %s
+    ''')
+    params = (P1, start, end)
+
+    if after_id is not None:
+        query += ' AND a."EVENT_ID" < %s'
+        params += (after_id,)
+    group_by = ", ".join(player_event_fields[name][0] for name in fields if name in player_event_group_fields)
+    query += f'''
+    GROUP BY {group_by}
+    ORDER BY a."EVENT_ID" DESC
+    LIMIT %s OFFSET %s
+    '''
+
+    results = run_select_query(query, params + (page_size, offset))
+    return paged_response(results, 'e', 'EVENT_ID')
+
+@app.route('/matchups/', methods=['GET'], strict_slashes=False)
+@cached_response
+def get_matchups():
+    start = request.args.get('start', '2024-08-25')
+    end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+    rollup = request.args.get('rollup', 'deck')
+
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d')
+        end = datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    if rollup == 'deck':
+        columns = '''m."P1_DECK_ID", b."ARCHETYPE" AS "P1_ARCH", b."SUBARCHETYPE" AS "P1_SUBARCH",
+        m."P2_DECK_ID", c."ARCHETYPE" AS "P2_ARCH", c."SUBARCHETYPE" AS "P2_SUBARCH"'''
+        group_by = 'm."P1_DECK_ID", b."ARCHETYPE", b."SUBARCHETYPE", m."P2_DECK_ID", c."ARCHETYPE", c."SUBARCHETYPE"'
+        order_by = 'b."ARCHETYPE", b."SUBARCHETYPE", c."ARCHETYPE", c."SUBARCHETYPE"'
+    elif rollup == 'archetype':
+        columns = 'b."ARCHETYPE" AS "P1_ARCH", c."ARCHETYPE" AS "P2_ARCH"'
+        group_by = 'b."ARCHETYPE", c."ARCHETYPE"'
+        order_by = 'b."ARCHETYPE", c."ARCHETYPE"'
+    else:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    query = f'''
+    SELECT {columns},
+        SUM(m."MATCHES") AS "MATCHES", SUM(m."WINS") AS "WINS", SUM(m."LOSSES") AS "LOSSES", SUM(m."DRAWS") AS "DRAWS",
+        ROUND(SUM(m."WINS")::numeric / NULLIF(SUM(m."WINS") + SUM(m."LOSSES"), 0), 4)::float8 AS "WIN_RATE"
+    FROM "[vapi].DECK_MATCHUPS" m
+    JOIN "[vapi].VALID_DECKS" b
+    ON m."P1_DECK_ID" = b."DECK_ID"
+    JOIN "[vapi].VALID_DECKS" c
+    ON m."P2_DECK_ID" = c."DECK_ID"
+    WHERE m."EVENT_DATE" >= %s AND m."EVENT_DATE" <= %s
+    GROUP BY {group_by}
+    ORDER BY {order_by}
+    '''
+
+    results = run_select_query(query, (start, end))
+    return jsonify(results)
+
+leaderboard_sort_columns = {
+    'events': '"EVENTS_PLAYED"',
+    'wins': '"MATCH_WINS"',
+    'losses': '"MATCH_LOSSES"',
+    'win_rate': '"WIN_RATE"',
+    'top8': '"TOP8_COUNT"',
+    'best_rank': '"BEST_RANK"',
+}
+
+@app.route('/players/leaderboard/', methods=['GET'], strict_slashes=False)
+@cached_response
+def get_player_leaderboard():
+    start = request.args.get('start', '2024-08-25')
+    end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+    sort = request.args.get('sort', 'wins')
+    order = request.args.get('order', 'asc' if sort == 'best_rank' else 'desc')
     page = request.args.get('page', 1)
+    min_events = request.args.get('min_events', 1)
 
     try:
         start = datetime.strptime(start, '%Y-%m-%d')
         end = datetime.strptime(end, '%Y-%m-%d')
         page = int(page)
+        min_events = int(min_events)
     except ValueError:
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
-    if page < 1:
+
+    if page < 1 or min_events < 1 or sort not in leaderboard_sort_columns or order not in ('asc', 'desc'):
         return jsonify({"error": "Invalid URL Parameter Format."}), 400
-    
+
     offset = (page - 1) * page_size
 
-    query = '''
-    SELECT x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE", MAX(x."ARCHETYPE") AS "ARCHETYPE", MAX(x."SUBARCHETYPE") AS "SUBARCHETYPE",
-        COUNT(CASE WHEN x."MATCH_WINNER" = 'P1' THEN 1 END) AS "WINS",
-        COUNT(CASE WHEN x."MATCH_WINNER" = 'P2' THEN 1 END) AS "LOSSES"
-    FROM (
-        SELECT a."P1", b."EVENT_ID", b."EVENT_DATE", c."FORMAT", c."EVENT_TYPE", a."MATCH_WINNER", d."ARCHETYPE", d."SUBARCHETYPE"
-            FROM "[vapi].MATCHES" a 
-            JOIN "[vapi].EVENTS" b 
-            ON a."EVENT_ID" = b."EVENT_ID"
-            JOIN "[vapi].VALID_EVENT_TYPES" c 
-            ON b."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
-            JOIN "[vapi].VALID_DECKS" d
-            ON a."P1_DECK_ID" = d."DECK_ID"
-            WHERE a."P1" = %s
-    ) x 
-    WHERE x."EVENT_DATE" >= %s AND x."EVENT_DATE" <= %s
-    GROUP BY x."EVENT_ID", x."EVENT_DATE", x."FORMAT", x."EVENT_TYPE"
-    ORDER BY x."EVENT_ID" DESC
+    query = f'''
+    SELECT p."PLAYER_NAME" AS "P1", COUNT(*) AS "EVENTS_PLAYED", SUM(r."WINS") AS "MATCH_WINS", SUM(r."LOSSES") AS "MATCH_LOSSES",
+        ROUND(SUM(r."WINS")::numeric / NULLIF(SUM(r."WINS") + SUM(r."LOSSES"), 0), 4)::float8 AS "WIN_RATE",
+        COUNT(*) FILTER (WHERE r."EVENT_RANK" BETWEEN 1 AND 8) AS "TOP8_COUNT",
+        MIN(r."EVENT_RANK") AS "BEST_RANK"
+    FROM "[vapi].PLAYER_EVENT_RECORDS" r
+    JOIN "[vapi].PLAYERS" p
+    ON r."P1_ID" = p."PLAYER_ID"
+    WHERE r."EVENT_DATE" >= %s AND r."EVENT_DATE" <= %s
+    GROUP BY r."P1_ID", p."PLAYER_NAME"
+    HAVING COUNT(*) >= %s
+    ORDER BY {leaderboard_sort_columns[sort]} {order.upper()} NULLS LAST, "P1" ASC
     LIMIT %s OFFSET %s
     '''
 
-    results = run_select_query(query, (P1, start, end, page_size, offset))
+    results = run_select_query(query, (start, end, min_events, page_size, offset))
     return jsonify(results)
 
-@app.route('/decks/', methods=['GET'])
-def get_valid_decks():
-    query = '''
-    SELECT "FORMAT", "ARCHETYPE", "SUBARCHETYPE", "DECK_ID"
-        FROM "[vapi].VALID_DECKS"
-    '''
+@app.route('/players/search/', methods=['GET'], strict_slashes=False)
+@cached_response
+def search_players():
+    q = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 10)
 
-    results = run_select_query(query)
+    try:
+        limit = int(limit)
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    if not q or len(q) > 30 or limit < 1 or limit > 50:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    # Matched against PLAYERS.PLAYER_KEY (trimmed, upper-cased), the same normalized name the player routes resolve.
+    # Prefix matches rank first by activity; trigram matches follow by similarity once q has 3+ characters.
+    term = q.upper()
+    prefix = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    if len(term) >= 3:
+        query = '''
+        SELECT p."PLAYER_NAME" AS "P1", a."EVENTS_PLAYED", a."MATCHES_PLAYED", a."LAST_EVENT_DATE"
+        FROM "[vapi].PLAYERS" p
+        JOIN "[vapi].PLAYER_ACTIVITY" a
+        ON a."P1_ID" = p."PLAYER_ID"
+        WHERE p."PLAYER_KEY" LIKE %s OR p."PLAYER_KEY" %% %s
+        ORDER BY p."PLAYER_KEY" LIKE %s DESC,
+            CASE WHEN p."PLAYER_KEY" LIKE %s THEN 1 ELSE similarity(p."PLAYER_KEY", %s) END DESC,
+            a."EVENTS_PLAYED" DESC, p."PLAYER_NAME" ASC
+        LIMIT %s
+        '''
+        params = (prefix, term, prefix, prefix, term, limit)
+    else:
+        query = '''
+        SELECT p."PLAYER_NAME" AS "P1", a."EVENTS_PLAYED", a."MATCHES_PLAYED", a."LAST_EVENT_DATE"
+        FROM "[vapi].PLAYERS" p
+        JOIN "[vapi].PLAYER_ACTIVITY" a
+        ON a."P1_ID" = p."PLAYER_ID"
+        WHERE p."PLAYER_KEY" LIKE %s
+        ORDER BY a."EVENTS_PLAYED" DESC, p."PLAYER_NAME" ASC
+        LIMIT %s
+        '''
+        params = (prefix, limit)
+
+    results = run_select_query(query, params)
     return jsonify(results)
 
-@app.route('/decks/<int:deck_id>/', methods=['GET'])
-def get_deck_id(deck_id):
+@app.route('/export/matches/', methods=['GET'], strict_slashes=False)
+@load_versioned
+def export_matches():
+    start = request.args.get('start', '2024-08-25')
+    end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d')
+        end = datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
     query = '''
-    SELECT "FORMAT", "ARCHETYPE", "SUBARCHETYPE", "DECK_ID"
-        FROM "[vapi].VALID_DECKS"
-        WHERE "DECK_ID" = %s
+    SELECT a."MATCH_ID", a."EVENT_ID", a."EVENT_DATE", a."P1", a."P1_DECK_ID", a."P1_ARCH", a."P1_SUBARCH", a."P1_WINS",
+    a."P2", a."P2_DECK_ID", a."P2_ARCH", a."P2_SUBARCH", a."P2_WINS", a."MATCH_WINNER"
+    FROM "[vapi].MATCH_RESULTS" a
+    WHERE a."EVENT_DATE" >= %s AND a."EVENT_DATE" <= %s
+    ORDER BY a."MATCH_ID"
     '''
 
-    results = run_select_query(query, (deck_id,))
-    return jsonify(results)
+    return export_response('matches', query, (start, end), start, end)
+
+@app.route('/export/events/', methods=['GET'], strict_slashes=False)
+@load_versioned
+def export_events():
+    start = request.args.get('start', '2024-08-25')
+    end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d')
+        end = datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
 
-@app.route('/event-types/', methods=['GET'])
-def get_valid_event_types():
     query = '''
-    SELECT "FORMAT", "EVENT_TYPE", "EVENT_TYPE_ID"
-        FROM "[vapi].VALID_EVENT_TYPES"
+    SELECT e."EVENT_ID", e."EVENT_DATE", c."FORMAT", c."EVENT_TYPE", e."TOTAL_PLAYERS"
+    FROM "[vapi].EVENTS" e
+    JOIN "[vapi].VALID_EVENT_TYPES" c 
+    ON e."EVENT_TYPE_ID" = c."EVENT_TYPE_ID"
+    WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" <= %s AND e."TOTAL_PLAYERS" > 0
+    ORDER BY e."EVENT_ID"
     '''
 
-    results = run_select_query(query)
-    return jsonify(results)
+    return export_response('events', query, (start, end), start, end)
+
+@app.route('/export/standings/', methods=['GET'], strict_slashes=False)
+@load_versioned
+def export_standings():
+    start = request.args.get('start', '2024-08-25')
+    end = request.args.get('end', (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d')
+        end = datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
 
-@app.route('/event-types/<int:event_type_id>/', methods=['GET'])
-def get_event_type_id(event_type_id):
     query = '''
-    SELECT "FORMAT", "EVENT_TYPE", "EVENT_TYPE_ID"
-        FROM "[vapi].VALID_EVENT_TYPES"
-        WHERE "EVENT_TYPE_ID" = %s
+    SELECT es."EVENT_ID", e."EVENT_DATE", ves."EVENT_TYPE", es."EVENT_RANK", es."P1", a."WINS", a."LOSSES", es."BYES"
+    FROM "[vapi].EVENTS" e 
+    JOIN "[vapi].EVENT_STANDINGS" es 
+    ON es."EVENT_ID" = e."EVENT_ID"
+    JOIN "[vapi].VALID_EVENT_TYPES" ves 
+    ON ves."EVENT_TYPE_ID" = e."EVENT_TYPE_ID"
+    JOIN "[vapi].PLAYER_EVENT_RECORDS" a
+    ON es."EVENT_ID" = a."EVENT_ID" AND es."P1_ID" = a."P1_ID"
+    WHERE e."EVENT_DATE" >= %s AND e."EVENT_DATE" <= %s
+    ORDER BY es."EVENT_ID", es."EVENT_RANK"
     '''
 
-    results = run_select_query(query, (event_type_id,))
-    return jsonify(results)
+    return export_response('standings', query, (start, end), start, end)
+
+@app.route('/snapshots/<path:filename>', methods=['GET'])
+def get_snapshot_file(filename):
+    if not snapshot_dir:
+        return jsonify({"error": "Snapshots are not enabled."}), 404
+    # Resolve the symlink per request so a swapped snapshot is picked up without a restart.
+    current = os.path.realpath(os.path.join(snapshot_dir, 'current'))
+    return send_from_directory(current, filename)
+
+# POST /batch/ runs several GET sub-requests on one pinned pool connection and returns them in one response.
+batch_max_requests = int(os.getenv("API_BATCH_MAX_REQUESTS", 20))
+
+def get_batch_requests():
+    body = request.get_json(silent=True)
+    items = body.get('requests') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not 0 < len(items) <= batch_max_requests:
+        raise ValueError(f"Between 1 and {batch_max_requests} requests are required.")
+
+    sub_requests = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise ValueError("Each request needs a path.")
+        path, _, query_string = item['path'].partition('?')
+        params = item.get('params') or {}
+        if not path.startswith('/') or not isinstance(params, dict) or (query_string and params):
+            raise ValueError("Invalid request path or params.")
+        sub_requests.append((path, query_string or urlencode(params, doseq=True)))
+    return sub_requests
+
+def run_batch_item(path, query_string, environ_base):
+    # A fresh app context keeps each sub-request's g (timings, validators) apart from the batch request's.
+    # Sub-requests go through the normal hooks, so they are cached, logged and rate limited like direct calls.
+    with app.app_context(), app.test_request_context(path, query_string=query_string, environ_base=environ_base):
+        try:
+            response = app.full_dispatch_request()
+        except Exception:
+            app.logger.exception("Error in batch request %s", path)
+            return 500, json.dumps({"error": "Internal Server Error."})
+        if response.is_json and not response.is_streamed:
+            return response.status_code, response.get_data(as_text=True).strip() or 'null'
+        response.close()
+        if response.status_code == 200:
+            return 400, json.dumps({"error": "Only non-streamed JSON responses are supported in /batch/."})
+        return response.status_code, 'null'
+
+@app.route('/batch/', methods=['POST'], strict_slashes=False)
+def run_batch():
+    try:
+        sub_requests = get_batch_requests()
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    environ_base = {'REMOTE_ADDR': request.remote_addr, 'HTTP_USER_AGENT': request.headers.get('User-Agent', '')}
+    items = []
+    with get_db_pool().pin():
+        for path, query_string in sub_requests:
+            status, body = run_batch_item(path, query_string, environ_base)
+            url = f"{path}?{query_string}" if query_string else path
+            # Sub-request bodies are already JSON text; they are spliced in rather than decoded and re-encoded.
+            items.append(f'{{"path":{json.dumps(url)},"status":{status},"body":{body}}}')
+    return Response('[' + ','.join(items) + ']\n', mimetype='application/json')
+
+@app.route('/decks/', methods=['GET'])
+@load_versioned
+def get_valid_decks():
+    fmt = request.args.get('format', 'json')
+    if fmt not in stream_formats:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+    if fmt == 'json':
+        return jsonify(classifications.decks())
+    return streamed_response(iter([classifications.decks()]), fmt)
+
+@app.route('/decks/bulk/', methods=['GET', 'POST'], strict_slashes=False)
+@load_versioned
+def get_decks_bulk():
+    try:
+        ids = get_bulk_ids()
+    except ValueError:
+        return jsonify({"error": "Invalid URL Parameter Format."}), 400
+
+    decks = classifications.decks_by_id()
+    return jsonify({str(deck_id): decks[deck_id] for deck_id in ids if deck_id in decks})
+
+@app.route('/decks/<int:deck_id>/', methods=['GET'])
+@load_versioned
+def get_deck_id(deck_id):
+    deck = classifications.decks_by_id().get(deck_id)
+    return jsonify([deck] if deck else [])
+
+@app.route('/event-types/', methods=['GET'])
+@load_versioned
+def get_valid_event_types():
+    return jsonify(classifications.event_types())
+
+@app.route('/event-types/<int:event_type_id>/', methods=['GET'])
+@load_versioned
+def get_event_type_id(event_type_id):
+    event_type = classifications.event_types_by_id().get(event_type_id)
+    return jsonify([event_type] if event_type else [])
+
+# /loads/stream/ pushes new loads over Server-Sent Events using the per-worker load watermark (get_latest_load).
+# A stream ends after API_LOAD_STREAM_SECONDS so it does not hold a Gunicorn worker indefinitely; EventSource reconnects.
+# Only threaded workers keep streams open, at most API_LOAD_STREAM_MAX per process; otherwise the client gets the
+# current load and a retry hint, so EventSource falls back to polling the watermark without tying up a worker.
+load_stream_seconds = float(os.getenv("API_LOAD_STREAM_SECONDS", 300))
+load_stream_heartbeat_seconds = float(os.getenv("API_LOAD_STREAM_HEARTBEAT_SECONDS", 15))
+load_stream_slots = threading.BoundedSemaphore(int(os.getenv("API_LOAD_STREAM_MAX", 4)))
+
+def load_event(load):
+    return f"id: {load['LOAD_RPT_ID']}\nevent: load\ndata: {app.json.dumps(load)}\n\n"
+
+@app.route('/loads/latest/', methods=['GET'], strict_slashes=False)
+@load_versioned
+def get_loads_latest():
+    return jsonify(get_latest_load())
+
+@app.route('/loads/stream/', methods=['GET'], strict_slashes=False)
+def stream_loads():
+    last_event_id = request.headers.get('Last-Event-ID')
+    # Sync workers serve one request at a time, so a held stream would block the whole worker.
+    threaded = request.environ.get('wsgi.multithread', False)
+
+    def generate():
+        # The slot is taken inside the generator so it is always released when the stream closes.
+        held = threaded and load_stream_slots.acquire(blocking=False)
+        try:
+            if held:
+                deadline = time.monotonic() + load_stream_seconds
+                yield "retry: 5000\n\n"
+            else:
+                deadline = time.monotonic()
+                yield f"retry: {int(max(load_check_seconds, 1) * 1000)}\n\n"
+            sent_id = last_event_id
+            while True:
+                try:
+                    load = get_latest_load()
+                except Exception:
+                    app.logger.exception("Error checking latest load for /loads/stream/")
+                    return
+                if load['LOAD_RPT_ID'] is not None and str(load['LOAD_RPT_ID']) != sent_id:
+                    sent_id = str(load['LOAD_RPT_ID'])
+                    yield load_event(load)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                time.sleep(min(load_stream_heartbeat_seconds, remaining))
+                # Comment line: keeps Nginx and client idle timeouts from closing the stream.
+                yield ": keepalive\n\n"
+        finally:
+            if held:
+                load_stream_slots.release()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/load-reports/', methods=['GET'])
+@cached_response
 def get_load_reports():
     query = '''
     SELECT *
@@ -428,10 +1264,10 @@ def get_load_reports():
         ORDER BY "LOAD_RPT_ID" DESC
     '''
 
-    results = run_select_query(query)
-    return jsonify(results)
+    return select_response(query)
 
 @app.route('/load-reports/<int:load_rpt_id>/', methods=['GET'])
+@cached_response
 def get_load_reports_by_load_rpt_id(load_rpt_id):
     query = '''
     SELECT *
@@ -444,6 +1280,7 @@ def get_load_reports_by_load_rpt_id(load_rpt_id):
     return jsonify(results)
 
 @app.route('/event-rejections/', methods=['GET'])
+@cached_response
 def get_event_rejections():
     query = '''
     SELECT *
@@ -451,10 +1288,10 @@ def get_event_rejections():
         ORDER BY "LOAD_RPT_ID" DESC
     '''
 
-    results = run_select_query(query)
-    return jsonify(results)
+    return select_response(query)
 
 @app.route('/event-rejections/<int:load_rpt_id>/', methods=['GET'])
+@cached_response
 def get_event_rejections_by_load_rpt_id(load_rpt_id):
     query = '''
     SELECT *
@@ -467,6 +1304,7 @@ def get_event_rejections_by_load_rpt_id(load_rpt_id):
     return jsonify(results)
 
 @app.route('/match-rejections/', methods=['GET'])
+@cached_response
 def get_match_rejections():
     query = '''
     SELECT *
@@ -474,10 +1312,10 @@ def get_match_rejections():
         ORDER BY "LOAD_RPT_ID" DESC
     '''
 
-    results = run_select_query(query)
-    return jsonify(results)
+    return select_response(query)
 
 @app.route('/match-rejections/<int:load_rpt_id>/', methods=['GET'])
+@cached_response
 def get_match_rejections_by_load_rpt_id(load_rpt_id):
     query = '''
     SELECT *
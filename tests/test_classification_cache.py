@@ -0,0 +1,54 @@
+import time
+
+from modules.classification_cache import ClassificationCache
+
+class FakeTables:
+    def __init__(self):
+        self.marker = {"DECKS": 1, "DECKS_PROC_DT": "2024-01-01", "EVENT_TYPES": 1, "EVENT_TYPES_PROC_DT": None}
+        self.decks = [{"FORMAT": "VINTAGE", "ARCHETYPE": "COMBO", "SUBARCHETYPE": "Doomsday", "DECK_ID": 1}]
+        self.event_types = [{"FORMAT": "VINTAGE", "EVENT_TYPE": "CHALLENGE", "EVENT_TYPE_ID": 1}]
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        if query == ClassificationCache.marker_query:
+            return [dict(self.marker)]
+        if query == ClassificationCache.decks_query:
+            return list(self.decks)
+        return list(self.event_types)
+
+def test_loads_on_first_use():
+    tables = FakeTables()
+    cache = ClassificationCache(tables, check_seconds=60)
+    assert cache.decks_by_id()[1]["SUBARCHETYPE"] == "Doomsday"
+    assert cache.event_types_by_id()[1]["EVENT_TYPE"] == "CHALLENGE"
+    assert cache.reloads == 1
+    assert len(tables.queries) == 3
+
+def test_marker_checked_once_per_interval():
+    tables = FakeTables()
+    cache = ClassificationCache(tables, check_seconds=60)
+    cache.decks()
+    tables.marker["DECKS"] = 2
+    cache.decks()
+    cache.version()
+    assert len(tables.queries) == 3
+    assert cache.reloads == 1
+
+def test_reloads_only_when_marker_changes():
+    tables = FakeTables()
+    cache = ClassificationCache(tables, check_seconds=0.01)
+    cache.decks()
+    time.sleep(0.02)
+    cache.decks()
+    assert cache.reloads == 1
+    assert len(tables.queries) == 4
+
+    tables.marker["DECKS"] = 2
+    tables.marker["DECKS_PROC_DT"] = "2024-01-08"
+    tables.decks.append({"FORMAT": "VINTAGE", "ARCHETYPE": "AGGRO", "SUBARCHETYPE": "White", "DECK_ID": 2})
+    time.sleep(0.02)
+    assert len(cache.decks()) == 2
+    assert cache.reloads == 2
+    assert cache.version() == "2|2024-01-08|1|None"
+    assert cache.last_modified() == "2024-01-08"
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from modules.db_pool import ConnectionPool, PoolTimeout
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        raise AssertionError("health check should not run for recently returned connections")
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    kwargs.setdefault("min_size", 0)
+    kwargs.setdefault("max_size", 2)
+    kwargs.setdefault("timeout", 0.2)
+    return ConnectionPool(connect, **kwargs), opened
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool(FakeConnection, min_size=3, max_size=2)
+
+def test_warm_opens_min_size():
+    pool, opened = make_pool(min_size=2)
+    pool.warm()
+    assert len(opened) == 2
+    assert pool.stats()["idle"] == 2
+
+def test_reuses_most_recently_returned():
+    pool, opened = make_pool()
+    a = pool.getconn()
+    b = pool.getconn()
+    pool.putconn(a)
+    pool.putconn(b)
+    assert pool.getconn() is b
+    assert len(opened) == 2
+    assert b.rollbacks == 1
+
+def test_timeout_when_exhausted():
+    pool, _ = make_pool(max_size=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 1
+
+def test_waiter_gets_returned_connection():
+    pool, opened = make_pool(max_size=1, timeout=2.0)
+    conn = pool.getconn()
+    result = {}
+
+    def wait():
+        result["conn"] = pool.getconn()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    pool.putconn(conn)
+    thread.join(1.0)
+    assert result["conn"] is conn
+    assert len(opened) == 1
+
+def test_failed_rollback_discards():
+    pool, _ = make_pool()
+    conn = pool.getconn()
+    conn.fail_rollback = True
+    pool.putconn(conn)
+    stats = pool.stats()
+    assert conn.closed
+    assert stats["discarded"] == 1
+    assert stats["size"] == 0
+
+def test_operational_error_discards_connection():
+    pool, opened = make_pool()
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection():
+            raise psycopg2.OperationalError("server closed the connection")
+    assert opened[0].closed
+    with pool.connection() as conn:
+        assert conn is opened[1]
+
+def test_pin_reuses_one_connection():
+    pool, opened = make_pool()
+    with pool.pin() as pinned:
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        assert first is pinned and second is pinned
+        assert pool.stats()["in_use"] == 1
+    stats = pool.stats()
+    assert len(opened) == 1
+    assert stats["pinned"] == 1
+    assert stats["in_use"] == 0
+
+def test_pinned_broken_connection_is_released():
+    pool, opened = make_pool()
+    with pool.pin():
+        with pytest.raises(psycopg2.OperationalError):
+            with pool.connection():
+                raise psycopg2.OperationalError("server closed the connection")
+        with pool.connection() as conn:
+            assert conn is opened[1]
+    assert opened[0].closed
+    assert pool.stats()["size"] == 1
+
+def test_recycles_old_connections():
+    pool, opened = make_pool(max_age=0.01)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    time.sleep(0.02)
+    assert pool.getconn() is opened[1]
+    assert conn.closed
+    assert pool.stats()["recycled"] == 1
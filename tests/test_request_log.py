@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from modules import request_log
+from modules.request_log import RequestLogWriter
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def batches(monkeypatch):
+    written = []
+    monkeypatch.setattr(request_log, "execute_values", lambda cursor, query, batch, page_size: written.append(list(batch)))
+    return written
+
+def test_writes_in_batches(batches):
+    writer = RequestLogWriter(FakeConnection, batch_size=2, flush_seconds=60)
+    for n in range(5):
+        writer.log((n,))
+    writer.close()
+    assert batches == [[(0,), (1,)], [(2,), (3,)], [(4,)]]
+    stats = writer.stats()
+    assert stats["queued"] == 5
+    assert stats["written"] == 5
+    assert stats["batches"] == 3
+
+def test_flushes_partial_batch_after_interval(batches):
+    writer = RequestLogWriter(FakeConnection, batch_size=100, flush_seconds=0.01)
+    writer.log((1,))
+    time.sleep(0.2)
+    assert batches == [[(1,)]]
+    writer.close()
+
+def test_full_queue_drops_without_blocking(batches):
+    connecting = threading.Event()
+    release = threading.Event()
+
+    def connect():
+        connecting.set()
+        release.wait(2.0)
+        return FakeConnection()
+
+    writer = RequestLogWriter(connect, max_queue=2, batch_size=1, flush_seconds=60)
+    writer.log((0,))
+    # The writer thread now holds record 0 and is stuck connecting; the queue fills up behind it.
+    assert connecting.wait(1.0)
+    for n in range(1, 5):
+        writer.log((n,))
+    stats = writer.stats()
+    assert stats["queued"] == 3
+    assert stats["dropped"] == 2
+    assert stats["queue_size"] == 2
+    release.set()
+    writer.close()
+    assert writer.stats()["written"] == 3
+
+def test_write_failure_is_counted(monkeypatch, caplog):
+    def fail(cursor, query, batch, page_size):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(request_log, "execute_values", fail)
+    writer = RequestLogWriter(FakeConnection, batch_size=2, flush_seconds=60)
+    writer.log((0,))
+    writer.log((1,))
+    writer.close()
+    stats = writer.stats()
+    assert stats["failed"] == 2
+    assert stats["written"] == 0
+    assert "API_LOGGING_STATS" in caplog.text
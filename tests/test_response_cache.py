@@ -0,0 +1,99 @@
+import time
+
+from werkzeug.datastructures import MultiDict
+
+from modules.response_cache import MemoryBackend, ResponseCache, SQLiteBackend, normalize_args
+
+def entry(body):
+    return (200, {"Content-Type": "application/json"}, body)
+
+def test_normalize_args_is_order_independent():
+    first = MultiDict([("b", "2"), ("a", "1"), ("a", "0")])
+    second = MultiDict([("a", "0"), ("a", "1"), ("b", "2")])
+    assert normalize_args(first) == normalize_args(second) == "a=0&a=1&b=2"
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", entry(b"a"))
+    backend.set("b", entry(b"b"))
+    backend.get("a")
+    backend.set("c", entry(b"c"))
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.get("c") is not None
+    assert backend.evictions == 1
+
+def test_memory_backend_bounded_by_bytes():
+    backend = MemoryBackend(max_entries=10, max_bytes=10)
+    backend.set("a", entry(b"x" * 6))
+    backend.set("b", entry(b"x" * 6))
+    assert backend.get("a") is None
+    assert backend.info()["bytes"] == 6
+    backend.set("c", entry(b"x" * 11))
+    assert backend.get("c") is None
+    assert backend.get("b") is not None
+
+def test_memory_backend_replace_keeps_byte_count():
+    backend = MemoryBackend()
+    backend.set("a", entry(b"x" * 5))
+    backend.set("a", entry(b"x" * 3))
+    assert backend.info()["bytes"] == 3
+    assert backend.info()["entries"] == 1
+
+def test_new_version_invalidates_entries():
+    versions = ["1|2024-01-01"]
+    cache = ResponseCache(MemoryBackend(), lambda: versions[0])
+    key = cache.make_key("/events/", MultiDict())
+    cache.set(key, *entry(b"[]"))
+    assert cache.get(key) is not None
+    versions[0] = "2|2024-01-08"
+    new_key = cache.make_key("/events/", MultiDict())
+    assert new_key != key
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["version"] == "2|2024-01-08"
+
+def test_stats_count_hits_and_misses():
+    cache = ResponseCache(MemoryBackend(), lambda: 1)
+    key = cache.make_key("/decks/", MultiDict())
+    assert cache.get(key) is None
+    cache.set(key, *entry(b"[]"))
+    assert cache.get(key) == entry(b"[]")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+
+def test_sqlite_backend_evicts_least_recently_used(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"), max_entries=2)
+    backend.set("v\x1fa", entry(b"a"))
+    backend.set("v\x1fb", entry(b"b"))
+    time.sleep(0.01)
+    backend.get("v\x1fa")
+    backend.set("v\x1fc", entry(b"c"))
+    assert backend.get("v\x1fb") is None
+    assert backend.get("v\x1fa") == entry(b"a")
+    assert backend.evictions == 1
+
+def test_sqlite_entries_survive_another_worker_with_same_version(tmp_path):
+    # Versions contain "|"; the full version must be stored so a second worker keeps the entries.
+    path = str(tmp_path / "cache.db")
+    version = "123|1|2024-01-01 00:00:00|2|None"
+    first = ResponseCache(SQLiteBackend(path), lambda: version)
+    key = first.make_key("/decks/", MultiDict())
+    first.set(key, *entry(b"[]"))
+    second = ResponseCache(SQLiteBackend(path), lambda: version)
+    assert second.make_key("/decks/", MultiDict()) == key
+    assert second.get(key) == entry(b"[]")
+
+def test_sqlite_version_change_clears_older_entries(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(SQLiteBackend(path), lambda: "123|1|2024-01-01")
+    key = first.make_key("/decks/", MultiDict())
+    first.set(key, *entry(b"[]"))
+    second = ResponseCache(SQLiteBackend(path), lambda: "124|1|2024-01-01")
+    new_key = second.make_key("/decks/", MultiDict())
+    second.set(new_key, *entry(b"[1]"))
+    assert second.get(key) is None
+    assert second.get(new_key) == entry(b"[1]")
+    assert second.backend.info()["entries"] == 1
@@ -0,0 +1,86 @@
+import json
+
+from modules.slow_query_log import SlowQueryLog
+
+query = '''
+SELECT * FROM "[vapi].EVENTS"
+    WHERE "EVENT_DATE" >= %s
+'''
+
+class FakeConnection:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class FakeCursor:
+    def __init__(self, plan=None, error=None):
+        self.connection = FakeConnection()
+        self.plan = plan
+        self.error = error
+        self.executed = []
+
+    def execute(self, query, params):
+        self.executed.append((query, params))
+        if self.error:
+            raise self.error
+
+    def fetchone(self):
+        return (self.plan,)
+
+def read_entries(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_fast_queries_not_logged(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(str(path), threshold_ms=500, explain_sample=1.0)
+    cursor = FakeCursor()
+    log.record(cursor, query, ("2024-01-01",), 0.499, 10, "/events/")
+    assert read_entries(path) == []
+    assert cursor.executed == []
+
+def test_slow_query_logged_without_plan(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(str(path), threshold_ms=500)
+    cursor = FakeCursor()
+    log.record(cursor, query, ("2024-01-01",), 0.75, 10, "/events/")
+    log.record(cursor, query, ("2024-02-01",), 1.5, 4, "/events/")
+    first, second = read_entries(path)
+    assert first["ROUTE"] == "/events/"
+    assert first["ELAPSED_MS"] == 750.0
+    assert first["ROWS"] == 10
+    assert first["QUERY"] == 'SELECT * FROM "[vapi].EVENTS" WHERE "EVENT_DATE" >= %s'
+    assert first["PARAMS"] == ["2024-01-01"]
+    assert first["QUERY_ID"] == second["QUERY_ID"]
+    assert "PLAN" not in first
+    assert cursor.executed == []
+
+def test_sampled_query_includes_plan(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(str(path), threshold_ms=500, explain_sample=1.0)
+    cursor = FakeCursor(plan=[{"Plan": {"Node Type": "Seq Scan"}, "Execution Time": 612.5}])
+    log.record(cursor, query, ("2024-01-01",), 0.75, 10, "/events/")
+    (entry,) = read_entries(path)
+    assert cursor.executed[0][0].startswith("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ")
+    assert entry["PLAN"]["Plan"]["Node Type"] == "Seq Scan"
+    assert entry["PLAN_EXECUTION_MS"] == 612.5
+
+def test_failed_explain_is_recorded_and_rolled_back(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(str(path), threshold_ms=500, explain_sample=1.0)
+    cursor = FakeCursor(error=RuntimeError("canceling statement due to statement timeout"))
+    log.record(cursor, query, ("2024-01-01",), 0.75, 10, "/events/")
+    (entry,) = read_entries(path)
+    assert "statement timeout" in entry["PLAN_ERROR"]
+    assert "PLAN" not in entry
+    assert cursor.connection.rollbacks == 1
+
+def test_unwritable_log_does_not_raise(tmp_path, caplog):
+    path = tmp_path / "missing" / "slow.jsonl"
+    log = SlowQueryLog(str(path), threshold_ms=0)
+    log.record(FakeCursor(), query, ("2024-01-01",), 0.75, 10, "/events/")
+    assert not path.exists()
+    assert "Error writing slow query log" in caplog.text